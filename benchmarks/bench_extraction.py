@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bs4 import BeautifulSoup
+from page_search import extract_text_from_html, clean_html
+from extractors import extract_text_from_pdf
+from ai_processing import sanitize_scraped_content, format_sources
+from sources import as_record
+from corpus import load_corpus
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+#fixed pure-python workload - timings are stored relative to it so baselines survive a change of machine
+def calibrate(repeat=5):
+    def workload():
+        total = 0
+        for i in range(300000):
+            total += i * i % 7
+        return total
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        workload()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+#benchmark cases: name -> (function, input size in bytes)
+def build_cases(corpus):
+    cases = {}
+
+    for name, html in corpus["html"].items():
+        size = len(html.encode("utf-8"))
+        cases[f"extract_text_from_html/text/{name}"] = (lambda html=html: extract_text_from_html(html, mode="text")[0], size)
+        cases[f"extract_text_from_html/html/{name}"] = (lambda html=html: extract_text_from_html(html, mode="html")[0], size)
+        #old main/article/body selection - the chars column shows what density scoring removes
+        cases[f"extract_text_from_html/simple/{name}"] = (lambda html=html: extract_text_from_html(html, mode="text", selector="simple")[0], size)
+
+        #clean_html gets an already parsed element, the same way extract_text_from_html calls it
+        body = BeautifulSoup(html, "html.parser").find("body")
+        cases[f"clean_html/{name}"] = (lambda body=body: clean_html(body), size)
+
+    for name, pdf in corpus["pdf"].items():
+        cases[f"extract_text_from_pdf/{name}"] = (lambda pdf=pdf: extract_text_from_pdf(pdf), len(pdf))
+
+    sources = corpus["sources"]
+    joined = "\n\n\n".join(source["content"] for source in sources) * 10
+    cases["sanitize_scraped_content/debug_x10"] = (lambda: sanitize_scraped_content(joined), len(joined.encode("utf-8")))
+
+    #the pipeline hands format_sources SourceRecords
+    many_sources = [as_record(source) for source in sources * 3]
+    sources_size = sum(len(source.content.encode("utf-8")) for source in many_sources)
+    cases["format_sources/debug_x3"] = (lambda: format_sources(many_sources), sources_size)
+
+    return cases
+
+#run one case: best wall time over repeats (least noisy), then one traced run for peak memory
+#fast cases are looped so a single sample takes at least min_sample seconds
+def measure(func, size, repeat, min_sample=0.05):
+    start = time.perf_counter()
+    output = func()  #warm up
+    single = time.perf_counter() - start
+    number = max(1, int(min_sample / single)) if single > 0 else 1
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "time_ms": best * 1000,
+        "throughput_mb_s": (size / (1024 * 1024)) / best if best else 0.0,
+        "peak_kb": peak / 1024,
+        "output_chars": len(output) if output else 0,
+    }
+
+def run_benchmarks(repeat=5, name_filter=None):
+    corpus = load_corpus()
+    cases = build_cases(corpus)
+    calibration = calibrate()
+
+    results = {}
+    for name, (func, size) in cases.items():
+        if name_filter and name_filter not in name:
+            continue
+        result = measure(func, size, repeat)
+        result["relative_time"] = (result["time_ms"] / 1000) / calibration
+        results[name] = result
+
+    return {"calibration_ms": calibration * 1000, "cases": results}
+
+def load_baselines(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("cases", {})
+
+def save_baselines(run, path=BASELINE_FILE):
+    stored = {
+        name: {"relative_time": result["relative_time"], "peak_kb": result["peak_kb"], "output_chars": result["output_chars"]}
+        for name, result in run["cases"].items()
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"cases": stored}, f, indent=4, sort_keys=True)
+        f.write("\n")
+
+#list regressions against the stored baselines (cases without a baseline are skipped)
+def compare(run, baselines, time_threshold=1.5, memory_threshold=1.25):
+    regressions = []
+    for name, result in run["cases"].items():
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        time_ratio = result["relative_time"] / baseline["relative_time"]
+        if time_ratio > time_threshold:
+            regressions.append(f"{name}: time x{time_ratio:.2f} (limit x{time_threshold})")
+        memory_ratio = result["peak_kb"] / baseline["peak_kb"] if baseline["peak_kb"] else 1.0
+        if memory_ratio > memory_threshold:
+            regressions.append(f"{name}: peak memory x{memory_ratio:.2f} (limit x{memory_threshold})")
+    return regressions
+
+def print_report(run, baselines):
+    print(f"\n{'case':<44} {'time ms':>9} {'MB/s':>8} {'peak KB':>10} {'chars':>9} {'vs base':>8}")
+    print("-" * 93)
+    for name, result in run["cases"].items():
+        baseline = baselines.get(name)
+        ratio = f"x{result['relative_time'] / baseline['relative_time']:.2f}" if baseline else "-"
+        print(
+            f"{name:<44} {result['time_ms']:>9.2f} {result['throughput_mb_s']:>8.2f} "
+            f"{result['peak_kb']:>10.0f} {result['output_chars']:>9} {ratio:>8}"
+        )
+    print(f"\n[*] Calibration loop: {run['calibration_ms']:.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline extraction micro-benchmarks")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--filter", default=None, help="only run cases containing this text")
+    parser.add_argument("--update", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--time-threshold", type=float, default=1.5, help="allowed slowdown factor")
+    parser.add_argument("--memory-threshold", type=float, default=1.25, help="allowed peak memory growth factor")
+    parser.add_argument("--output", default=None, help="write raw results to this JSON file")
+    args = parser.parse_args()
+
+    run = run_benchmarks(args.repeat, args.filter)
+    baselines = load_baselines()
+    print_report(run, baselines)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=4)
+
+    if args.update:
+        save_baselines(run)
+        print(f"[+] Baselines saved to {BASELINE_FILE}")
+        return 0
+
+    regressions = compare(run, baselines, args.time_threshold, args.memory_threshold)
+    if regressions:
+        print("\n[!] Performance regressions:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+
+    print("[+] No regressions against baselines")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import os
+import json
+import random
+
+#fixed vocabulary so every run builds byte-identical pages
+WORDS = (
+    "služby kontakt otevírací doba pobočka cena produkt podpora zákazník aplikace systém "
+    "redakční intranet evidence projektů obchod správa města obce firma reference návod "
+    "services contact opening hours branch price product support customer application"
+).split()
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def _page(title, body, head_extra=""):
+    return (
+        f"<!DOCTYPE html><html lang=\"cs\"><head><meta charset=\"utf-8\"><title>{title}</title>"
+        f"{head_extra}</head><body>{body}</body></html>"
+    )
+
+def _navigation(rng, links=40):
+    items = ''.join(f'<li><a href="/menu/{i}">{_text(rng, 2)}</a></li>' for i in range(links))
+    return f'<header><nav><ul>{items}</ul></nav></header>'
+
+def _footer(rng):
+    return (
+        f'<footer><p>{_text(rng, 30)}</p>'
+        f'<div class="cookie-banner">Tento web používá cookies. <a href="/gdpr">Souhlasím</a></div></footer>'
+    )
+
+#small company page with a short main section
+def small_page():
+    rng = random.Random(1)
+    body = (
+        _navigation(rng, 10)
+        + f'<main><h1>Kontakt</h1><p>{_text(rng, 80)}</p><p>{_text(rng, 60)}</p></main>'
+        + _footer(rng)
+    )
+    return _page("Kontakt - firma", body)
+
+#very long article page (~1MB)
+def huge_page():
+    rng = random.Random(2)
+    sections = ''.join(
+        f'<section><h2>{_text(rng, 4)}</h2><p>{_text(rng, 200)}</p>'
+        f'<ul>{"".join(f"<li>{_text(rng, 8)}</li>" for _ in range(10))}</ul></section>'
+        for _ in range(400)
+    )
+    body = _navigation(rng) + f'<article><h1>Dokumentace</h1>{sections}</article>' + _footer(rng)
+    return _page("Dokumentace - firma", body)
+
+#price list with large tables
+def table_page():
+    rng = random.Random(3)
+    tables = ''
+    for t in range(10):
+        rows = ''.join(
+            f'<tr><td class="name">{_text(rng, 3)}</td><td>{rng.randint(100, 9999)} Kč</td>'
+            f'<td><a href="/p/{t}/{r}">{_text(rng, 2)}</a></td></tr>'
+            for r in range(100)
+        )
+        tables += f'<h2>Ceník {t}</h2><table><thead><tr><th>Položka</th><th>Cena</th><th>Detail</th></tr></thead><tbody>{rows}</tbody></table>'
+    body = _navigation(rng) + f'<main><h1>Ceník</h1>{tables}</main>' + _footer(rng)
+    return _page("Ceník - firma", body)
+
+#page dominated by inline scripts, styles and tracking snippets
+def script_page():
+    rng = random.Random(4)
+    script = 'var data = ' + json.dumps([{"id": i, "text": _text(rng, 10)} for i in range(3000)]) + ';'
+    style = ''.join(f'.c{i} {{ margin: {i}px; color: #{i:06x}; }}' for i in range(5000))
+    head = f'<style>{style}</style><script>{script}</script>'
+    body = (
+        _navigation(rng)
+        + f'<div id="app"><div class="content"><h1>Aplikace</h1><p>{_text(rng, 150)}</p></div></div>'
+        + f'<script>{script}</script><noscript>{_text(rng, 20)}</noscript>'
+        + _footer(rng)
+    )
+    return _page("Aplikace - firma", body, head)
+
+#CMS page built from plain divs - mega-menu, cookie consent, sidebar link farm and share bar, no main/article
+def boilerplate_page():
+    rng = random.Random(6)
+    menu = ''.join(
+        f'<div class="menu-column"><span>{_text(rng, 2)}</span><ul>'
+        + ''.join(f'<li><a href="/m/{c}/{i}">{_text(rng, 3)}</a></li>' for i in range(12))
+        + '</ul></div>'
+        for c in range(8)
+    )
+    related = ''.join(f'<li><a href="/clanek/{i}">{_text(rng, 6)}</a> <span>{rng.randint(1, 28)}. 5.</span></li>' for i in range(30))
+    body = (
+        f'<div id="cookie-consent"><p>{_text(rng, 40)}</p><a href="/gdpr">Souhlasím</a></div>'
+        f'<div class="top-bar"><div class="megamenu">{menu}</div></div>'
+        '<div class="wrapper"><div class="post-content">'
+        f'<h1>Aktuality</h1>' + ''.join(f'<p>{_text(rng, 70)}, {_text(rng, 30)}.</p>' for _ in range(8))
+        + f'<div class="share-buttons"><a href="/fb">Facebook</a> <a href="/x">X</a> <a href="/mail">E-mail</a></div>'
+        '</div>'
+        f'<div class="sidebar"><h3>Související články</h3><ul>{related}</ul>'
+        f'<div class="newsletter"><p>{_text(rng, 25)}</p><form><input name="email"></form></div></div></div>'
+        f'<div class="site-info"><p>{_text(rng, 30)}</p></div>'
+    )
+    return _page("Aktuality - firma", body)
+
+#minimal valid PDF with plain text pages
+def make_pdf(pages, lines_per_page=45, seed=5):
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  #page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for _ in range(pages):
+        lines = ''.join(
+            f"({' '.join(rng.choice(WORDS[-9:]) for _ in range(10))}) Tj T* " for _ in range(lines_per_page)
+        )
+        stream = f"BT /F1 10 Tf 14 TL 50 800 Td {lines}ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = ' '.join(f"{i} 0 R" for i in page_ids).encode("ascii")
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        pdf += b"%010d 00000 n \n" % offset
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+#scraped sources from a past run, frozen here - the live tests rewrite debug/ on every run
+SOURCES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sources.json")
+
+def frozen_sources():
+    with open(SOURCES_FILE, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [
+        {"url": source["url"], "type": "html", "title": source["url"], "content": source["content"], "length": len(source["content"])}
+        for source in data["sources"]
+    ]
+
+#full corpus - built once per benchmark run
+def load_corpus():
+    return {
+        "html": {
+            "small": small_page(),
+            "huge": huge_page(),
+            "table": table_page(),
+            "script": script_page(),
+            "boilerplate": boilerplate_page(),
+        },
+        "pdf": {
+            "short": make_pdf(2),
+            "long": make_pdf(8),
+        },
+        "sources": frozen_sources(),
+    }
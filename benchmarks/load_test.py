@@ -0,0 +1,393 @@
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import tempfile
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  #not available on Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import small_page, huge_page, table_page, script_page, boilerplate_page, make_pdf
+
+#sample questions, rotated between simulated users
+QUESTIONS = [
+    "Jaké služby firma nabízí pro obce?",
+    "Kde najdu kontakt na podporu?",
+    "Jaká je otevírací doba pobočky?",
+    "Kolik stojí správa redakčního systému?",
+    "What products does the company offer for city councils?",
+    "How do I contact customer support?",
+    "Jak funguje evidence projektů v intranetu?",
+    "Which references does the company have?",
+]
+
+#pages served by the stand-in site: (content type, body)
+def stand_in_pages():
+    return [
+        ("text/html; charset=utf-8", small_page().encode("utf-8")),
+        ("text/html; charset=utf-8", boilerplate_page().encode("utf-8")),
+        ("text/html; charset=utf-8", table_page().encode("utf-8")),
+        ("text/html; charset=utf-8", script_page().encode("utf-8")),
+        ("application/pdf", make_pdf(2)),
+        ("text/html; charset=utf-8", huge_page().encode("utf-8")),
+    ]
+
+#one local server playing the target site, the Custom Search API and the AI API
+#latencies are drawn around the configured means; ai_slots caps concurrent completions like a provider would
+#public_host is the name site links use - a Selenium container reaches the host as e.g. host.docker.internal
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, page_latency=0.05, search_latency=0.15, ai_latency=0.5, ai_slots=4,
+                 error_rate=0.0, confidence="high", seed=7, bind_host="127.0.0.1", public_host=None):
+        super().__init__((bind_host, 0), StandInHandler)
+        self.local_host = "127.0.0.1" if bind_host in ("", "0.0.0.0") else bind_host
+        self.public_host = public_host or self.local_host
+        self.pages = stand_in_pages()
+        self.page_latency = page_latency
+        self.search_latency = search_latency
+        self.ai_latency = ai_latency
+        self.ai_slots = threading.BoundedSemaphore(ai_slots)
+        self.error_rate = error_rate
+        self.confidence = confidence
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+    #address of the API stand-ins, used by this process only
+    @property
+    def base_url(self):
+        return f"http://{self.local_host}:{self.server_address[1]}"
+
+    #address of the stand-in site, used in search results the browser opens
+    @property
+    def site_url(self):
+        return f"http://{self.public_host}:{self.server_address[1]}"
+
+    def delay(self, mean):
+        with self.rng_lock:
+            return self.rng.uniform(0.5, 1.5) * mean
+
+    def fails(self):
+        with self.rng_lock:
+            return self.rng.random() < self.error_rate
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, data, status=200):
+        self.send_body(status, "application/json", json.dumps(data).encode("utf-8"))
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path.startswith("/site/"):
+            time.sleep(server.delay(server.page_latency))
+            if server.fails():
+                return self.send_body(503, "text/plain", b"Service Unavailable")
+            page = int(url.path.rsplit("/", 1)[-1]) % len(server.pages)
+            content_type, body = server.pages[page]
+            return self.send_body(200, content_type, body)
+
+        if url.path == "/customsearch/v1":
+            time.sleep(server.delay(server.search_latency))
+            if server.fails():
+                return self.send_json({"error": {"code": 500, "message": "backend error"}}, 500)
+            query = parse_qs(url.query).get("q", [""])[0]
+            start = zlib.crc32(query.encode("utf-8"))
+            items = [
+                {
+                    "link": f"{server.site_url}/site/{(start + i) % 50}",
+                    "title": f"{query} - výsledek {i + 1}",
+                    "snippet": f"Stránka o tématu {query}, služby, kontakt a ceník.",
+                }
+                for i in range(10)
+            ]
+            return self.send_json({"items": items})
+
+        self.send_body(404, "text/plain", b"Not Found")
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            return self.send_body(404, "text/plain", b"Not Found")
+
+        with server.ai_slots:
+            time.sleep(server.delay(server.ai_latency))
+        if server.fails():
+            return self.send_json({"error": "overloaded"}, 503)
+
+        content = self.completion(payload)
+        self.send_json({"choices": [{"message": {"role": "assistant", "content": json.dumps(content)}}]})
+
+    #structured answer matching the requested response format
+    def completion(self, payload):
+        name = payload.get("response_format", {}).get("json_schema", {}).get("name")
+        question = payload["messages"][-1]["content"]
+        topic = " ".join(question.split()[:6])
+
+        if name == "search_queries":
+            return {"queries": [f"{topic} služby", f"{topic} kontakt"], "is_appropriate": True, "reason": ""}
+        if name == "search_queries_batch":
+            numbered = [line for line in question.splitlines() if line.startswith("[")]
+            return {"results": [
+                {"index": i, "queries": [f"{line[:40]} služby"], "is_appropriate": True, "reason": ""}
+                for i, line in enumerate(numbered, 1)
+            ]}
+        if name == "source_findings":
+            return {"relevant": True, "findings": [question[-200:]]}
+        return {
+            "summary": f"Stand-in answer about {topic}",
+            "key_points": ["stand-in point"],
+            "sources_used": [],
+            "confidence": self.server.confidence,
+        }
+
+#thread-safe latency and error collection per pipeline stage
+class StageStats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds, failed=False):
+        with self.lock:
+            self.latencies.setdefault(stage, []).append(seconds)
+            if failed:
+                self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    #wrap a pipeline function so every call is timed; None counts as a failure where failed_on_none is set
+    def timed(self, stage, func, failed_on_none=False):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                self.record(stage, time.perf_counter() - start, failed=True)
+                raise
+            self.record(stage, time.perf_counter() - start, failed=failed_on_none and not result)
+            return result
+        return wrapper
+
+    def summary(self):
+        with self.lock:
+            return {
+                stage: {
+                    "count": len(values),
+                    "errors": self.errors.get(stage, 0),
+                    "error_rate": self.errors.get(stage, 0) / len(values),
+                    "p50_ms": percentile(values, 50) * 1000,
+                    "p95_ms": percentile(values, 95) * 1000,
+                    "p99_ms": percentile(values, 99) * 1000,
+                    "max_ms": max(values) * 1000,
+                }
+                for stage, values in self.latencies.items()
+            }
+
+#nearest-rank percentile
+def percentile(values, pct):
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+#peak resident set size of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+#point the pipeline at the stand-ins - must run before main is imported
+def configure_environment(server, host_rate):
+    os.environ.setdefault("PYTHONPATH", os.path.join(ROOT, "src"))
+    os.environ["AI_API_URL"] = f"{server.base_url}/chat/completions"
+    os.environ["CSE_API_ENDPOINT"] = server.base_url
+    os.environ["AI_API_KEY"] = "stand-in"
+    os.environ["GOOGLE_API_KEY"] = "stand-in"
+    os.environ["SEARCH_ENGINE_ID"] = "stand-in"
+    os.environ["CSE_DAILY_QUOTA"] = "1000000"
+    os.environ["CSE_QUOTA_FILE"] = os.path.join(tempfile.mkdtemp(prefix="load_test_"), "cse_quota.json")
+    #every stand-in page lives on one host - politeness would otherwise serialize all fetches
+    os.environ["SCRAPE_RATE_PER_HOST"] = str(host_rate)
+    os.environ["SCRAPE_BURST"] = str(max(2, host_rate))
+
+#time the stage functions main.py calls, as module globals so speculative searches are timed too
+def instrument(main_module, page_search_module, stats):
+    main_module.generate_search_queries = stats.timed("generate_queries", main_module.generate_search_queries, True)
+    main_module.generate_search_queries_batched = stats.timed("generate_queries", main_module.generate_search_queries_batched, True)
+    main_module.search_google = stats.timed("search", main_module.search_google)
+    main_module.fetch_page_text = stats.timed("fetch", main_module.fetch_page_text, True)
+    main_module.summarize = stats.timed("summarize", main_module.summarize)
+    page_search_module.fetch_with_selenium = stats.timed("selenium", page_search_module.fetch_with_selenium, True)
+
+#drive run_search with a fixed number of requests
+#rate > 0: open loop, requests arrive as a Poisson process and queue for the workers (latency includes queueing)
+#rate = 0: closed loop, each worker sends its next request as soon as the previous one finished
+def run_load_test(requests=20, concurrency=4, rate=0.0, mode=None, unique=False, use_selenium=False,
+                  page_latency=0.05, search_latency=0.15, ai_latency=0.5, ai_slots=4, error_rate=0.0,
+                  confidence="high", host_rate=1000, verbose=False, seed=7, bind_host="127.0.0.1", public_host=None):
+    server = StandInServer(
+        page_latency, search_latency, ai_latency, ai_slots, error_rate, confidence, seed, bind_host, public_host
+    ).start()
+    configure_environment(server, host_rate)
+    if use_selenium:
+        os.environ["FORCE_SELENIUM"] = "True"
+
+    import main as pipeline
+    import page_search
+    stats = StageStats()
+    instrument(pipeline, page_search, stats)
+    rng = random.Random(seed)
+
+    def question(number):
+        text = QUESTIONS[number % len(QUESTIONS)]
+        #a unique suffix defeats the search cache so every request reaches Custom Search
+        return f"{text} {number}" if unique else text
+
+    def one_request(number, arrived):
+        start = time.perf_counter()
+        failed = False
+        try:
+            failed = pipeline.run_search(question(number), mode=mode) is None
+        except Exception:
+            failed = True
+        end = time.perf_counter()
+        stats.record("queue_wait", start - arrived)
+        stats.record("request", end - arrived, failed=failed)
+
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, \
+                (contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull)), \
+                ThreadPoolExecutor(max_workers=concurrency) as executor:
+            if rate > 0:
+                next_arrival = started
+                for number in range(requests):
+                    delay = next_arrival - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    executor.submit(one_request, number, time.perf_counter())
+                    next_arrival += rng.expovariate(rate)
+            else:
+                counter = iter(range(requests))
+                counter_lock = threading.Lock()
+
+                def worker():
+                    while True:
+                        with counter_lock:
+                            number = next(counter, None)
+                        if number is None:
+                            return
+                        one_request(number, time.perf_counter())
+
+                for _ in range(concurrency):
+                    executor.submit(worker)
+    finally:
+        server.stop()
+    elapsed = time.perf_counter() - started
+
+    stages = stats.summary()
+    completed = stages.get("request", {}).get("count", 0) - stages.get("request", {}).get("errors", 0)
+    return {
+        "config": {
+            "requests": requests, "concurrency": concurrency, "rate": rate, "mode": mode or os.getenv("PIPELINE_MODE", "full"),
+            "unique": unique, "selenium": use_selenium, "page_latency": page_latency, "search_latency": search_latency,
+            "ai_latency": ai_latency, "ai_slots": ai_slots, "error_rate": error_rate,
+        },
+        "elapsed_s": elapsed,
+        "throughput_rps": completed / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_before_mb": rss_before,
+        "stages": stages,
+    }
+
+def print_report(run):
+    config = run["config"]
+    arrival = f"{config['rate']:.2f} req/s open loop" if config["rate"] > 0 else "closed loop"
+    print(f"\n[*] {config['requests']} requests, concurrency {config['concurrency']}, {arrival}, mode '{config['mode']}'")
+    print(f"\n{'stage':<18} {'count':>6} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    print("-" * 72)
+    order = ["request", "queue_wait", "generate_queries", "search", "fetch", "selenium", "summarize"]
+    for stage in sorted(run["stages"], key=lambda name: order.index(name) if name in order else len(order)):
+        result = run["stages"][stage]
+        print(
+            f"{stage:<18} {result['count']:>6} {result['errors']:>7} {result['p50_ms']:>9.1f} "
+            f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['max_ms']:>9.1f}"
+        )
+    print(f"\n[*] Elapsed: {run['elapsed_s']:.2f}s, throughput: {run['throughput_rps']:.2f} answered requests/s")
+    request = run["stages"].get("request")
+    if request:
+        print(f"[*] Request error rate: {request['error_rate'] * 100:.1f}%")
+    if run["peak_rss_mb"] is not None:
+        print(f"[*] Peak RSS: {run['peak_rss_mb']:.1f} MB (before the run: {run['rss_before_mb']:.1f} MB)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test of run_search against local stand-in backends")
+    parser.add_argument("--requests", type=int, default=20, help="total requests to send")
+    parser.add_argument("--concurrency", type=int, default=4, help="pipeline requests running at once")
+    parser.add_argument("--rate", type=float, default=0.0, help="arrival rate in requests/s (0 = closed loop)")
+    parser.add_argument("--mode", choices=["snippet", "light", "full"], default=None, help="pipeline tier (default: PIPELINE_MODE)")
+    parser.add_argument("--unique", action="store_true", help="make every question unique so the search cache never hits")
+    parser.add_argument("--selenium", action="store_true", help="fetch pages through Selenium (FORCE_SELENIUM)")
+    parser.add_argument("--page-latency", type=float, default=0.05, help="mean stand-in page latency in seconds")
+    parser.add_argument("--search-latency", type=float, default=0.15, help="mean stand-in Custom Search latency in seconds")
+    parser.add_argument("--ai-latency", type=float, default=0.5, help="mean stand-in completion latency in seconds")
+    parser.add_argument("--ai-slots", type=int, default=4, help="completions the stand-in AI serves at once")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stand-in responses that fail")
+    parser.add_argument("--confidence", default="high", help="confidence the stand-in AI answers with ('low' forces escalation)")
+    parser.add_argument("--host-rate", type=float, default=1000, help="SCRAPE_RATE_PER_HOST for the stand-in site")
+    parser.add_argument("--bind-host", default="127.0.0.1", help="address the stand-in server listens on (0.0.0.0 for containers)")
+    parser.add_argument("--public-host", default=None, help="host name in stand-in page links, e.g. host.docker.internal")
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's own output")
+    parser.add_argument("--output", default=None, help="write raw results to this JSON file")
+    args = parser.parse_args()
+
+    run = run_load_test(
+        args.requests, args.concurrency, args.rate, args.mode, args.unique, args.selenium,
+        args.page_latency, args.search_latency, args.ai_latency, args.ai_slots, args.error_rate,
+        args.confidence, args.host_rate, args.verbose, bind_host=args.bind_host, public_host=args.public_host
+    )
+    print_report(run)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,6 +19,9 @@ setup(
         "pdfplumber>=0.5.0",
     ],
     extras_require={
+        "tokens": [
+            "tiktoken>=0.5.0",
+        ],
         "dev": [
             "pytest>=7.0.0",
             "pytest-cov>=3.0.0",
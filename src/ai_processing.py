@@ -1,13 +1,21 @@
+import io
 import os
 import requests
 import json
 import re
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from pydantic import BaseModel
 from typing import List, Dict
+from profiling import bind, traced
+from sources import SourceRecord, as_record, sanitize_scraped_content
 
 load_dotenv()
 
+AI_API_URL = os.getenv("AI_API_URL", "https://chetty-api.mateides.com/chat/completions")
+
 #structured output models
 class SearchQueries(BaseModel):
     queries: List[str]
@@ -20,7 +28,399 @@ class AIResponse(BaseModel):
     sources_used: List[str]
     confidence: str
 
+#answer to an input that skipped query generation, screened in the same request
+class ScreenedAIResponse(AIResponse):
+    is_appropriate: bool
+    reason: str = ""
+
+class SourceFindings(BaseModel):
+    relevant: bool
+    findings: List[str]
+
+class BatchedSearchQueries(BaseModel):
+    index: int
+    queries: List[str]
+    is_appropriate: bool
+    reason: str = ""
+
+class SearchQueriesBatch(BaseModel):
+    results: List[BatchedSearchQueries]
+
+#prompt templates - static text first so every request shares a byte-stable prefix
+#(provider-side prompt caching); per-request settings are appended at the end
+
+#shared by query generation and screened answers
+APPROPRIATENESS_CHECK = (
+    "## APPROPRIATENESS CHECK:\n"
+    "Mark as INAPPROPRIATE (is_appropriate=false) if the input:\n"
+    "- Requests personal/confidential data (passwords, private info, internal documents)\n"
+    "- Contains illegal/harmful content (hacking, violence, discrimination)\n"
+    "- Asks for technical internals (SQL queries, API keys, source code)\n"
+    "- Is completely off-topic, irrelevant to the company or spam\n\n"
+    "Mark as APPROPRIATE (is_appropriate=true) if the input:\n"
+    "- Asks about company info, products, services, contact details\n"
+    "- Seeks public information (pricing, locations, support)\n"
+    "- Is a general customer inquiry\n\n"
+)
+
+QUERY_SYSTEM_PROMPT = (
+    "You are an expert search query generator for a company's AI search system. "
+    "Your task is to transform user questions into effective Google search queries.\n\n"
+
+    "## CORE RULES:\n"
+    "1. Generate 2-4 diverse queries targeting DIFFERENT information angles\n"
+    "2. Always include the company from REQUEST SETTINGS in each query (unless already present)\n"
+    "3. Use natural language phrases that appear on real websites\n"
+    "4. Think like a search engine: use terms from page titles, headings, meta descriptions\n"
+    "5. Follow the language rule from REQUEST SETTINGS\n\n"
+
+    "## EFFECTIVE QUERY PATTERNS:\n"
+    "Different information sources: official page, contact page, about page, FAQ\n"
+    "Related context: location-based, service-based, category-based\n\n"
+
+    "## QUERY GENERATION EXAMPLES (COMPANY stands for the company from REQUEST SETTINGS):\n"
+    "User: 'Do you have branch offices?'\n"
+    "→ ['COMPANY branches contact',  # Official contact info\n"
+    "    'COMPANY where to find us',  # Natural FAQ phrase\n"
+    "    'COMPANY branch network map']  # Geographic coverage\n\n"
+
+    "User: 'What are your opening hours?'\n"
+    "→ ['COMPANY opening hours',     # Direct term\n"
+    "    'COMPANY weekend hours',      # Specific aspect\n"
+    "    'COMPANY contact working hours']  # Contact page context\n\n"
+
+    "User: 'pricing for premium plan'\n"
+    "→ ['COMPANY pricing premium plan',   # Pricing page term\n"
+    "    'COMPANY premium price monthly',  # Specific detail\n"
+    "    'COMPANY premium package cost']  # Natural question\n\n"
+
+    "User: 'How do I contact support?'\n"
+    "→ ['COMPANY customer support',  # Official support page\n"
+    "    'COMPANY technical help email',      # Specific channel\n"
+    "    'COMPANY helpdesk chat']              # Alternative channel\n\n"
+
+    + APPROPRIATENESS_CHECK +
+
+    "## SPECIAL CASES:\n"
+    "- If input is already a search query (keywords only), use it as-is and add 1-2 variations\n"
+    "- If question has multiple sub-questions, generate queries for each part\n"
+    "- For vague questions, create broader queries to capture relevant results"
+)
+
+QUERY_LANGUAGES = {
+    "cs": "Generate all queries in Czech language.",
+    "en": "Generate all queries in English language.",
+    "sk": "Generate all queries in Slovak language.",
+    "auto": "Generate queries in the same language as the user input (Czech if user writes in Czech, English if English, etc.)."
+}
+
+QUERY_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "search_queries",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "queries": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of search queries"
+                },
+                "is_appropriate": {
+                    "type": "boolean",
+                    "description": "Whether the input is appropriate for searching"
+                },
+                "reason": {
+                    "type": "string",
+                    "description": "Reason if inappropriate, empty otherwise"
+                }
+            },
+            "required": ["queries", "is_appropriate", "reason"],
+            "additionalProperties": False
+        }
+    }
+}
+
+#batch instructions go to the user message so the system prefix stays shared with single requests
+QUERY_BATCH_INSTRUCTION = (
+    "## BATCH MODE:\n"
+    "You receive several independent user inputs, numbered below. Handle each one separately, "
+    "exactly as described in the system instructions, and return one result per input with its index.\n\n"
+)
+
+QUERY_BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "search_queries_batch",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "index": {
+                                "type": "integer",
+                                "description": "Number of the user input this result belongs to"
+                            },
+                            **QUERY_RESPONSE_FORMAT["json_schema"]["schema"]["properties"]
+                        },
+                        "required": ["index", "queries", "is_appropriate", "reason"],
+                        "additionalProperties": False
+                    },
+                    "description": "One result per user input"
+                }
+            },
+            "required": ["results"],
+            "additionalProperties": False
+        }
+    }
+}
+
+ANSWER_SYSTEM_PROMPT = (
+    "You are the company's AI assistant. Your role is to provide accurate, helpful answers based solely on the provided sources.\n\n"
+
+    "## YOUR TASK:\n"
+    "Analyze the sources and answer the user's question with precision and clarity.\n\n"
+
+    "## ANSWER GUIDELINES:\n"
+    "1. **Use ONLY information from the provided sources** - never add external knowledge\n"
+    "2. **Cite sources** using format '[Source X]' when referencing specific information\n"
+    "3. **Be concise** - provide direct answers, avoid unnecessary elaboration\n"
+    "4. **Be honest** - if sources don't contain the answer, clearly state this\n"
+    "5. Follow the language rule from REQUEST SETTINGS\n\n"
+
+    "## KEY POINTS EXTRACTION:\n"
+    "- Extract 3-5 key points (fewer if information is limited, more only if critical)\n"
+    "- Include relevant numbers, dates, or specifics when available\n\n"
+
+    "## CONFIDENCE ASSESSMENT:\n"
+    "Set confidence level based on:\n"
+    "- **HIGH**: Multiple sources confirm the answer, information is detailed and recent\n"
+    "- **MEDIUM**: Answer found but limited sources, some gaps in information, or slightly outdated\n"
+    "- **LOW**: Minimal relevant information, sources tangentially related, or conflicting data\n\n"
+
+    "## HANDLING EDGE CASES:\n"
+    "- **Conflicting sources**: Mention both viewpoints, cite each source, set confidence to MEDIUM or LOW\n"
+    "- **No relevant info**: State clearly 'The provided sources do not contain information about...'\n"
+    "- **Partial answer**: Provide what you can, explicitly note what's missing\n"
+    "- **Outdated info**: Mention if sources appear old, adjust confidence accordingly\n\n"
+
+    "## SOURCES_USED FIELD:\n"
+    "Include only the URLs of sources you actually referenced in your answer (not all provided sources)."
+)
+
+ANSWER_LANGUAGES = {
+    "auto": "IMPORTANT: Detect the language from the user query and respond in that language. All text in summary and key_points must be in the detected language.",
+    "cs": "IMPORTANT: Always respond in Czech language (česky). All text in summary and key_points must be in Czech.",
+    "en": "IMPORTANT: Always respond in English. All text in summary and key_points must be in English.",
+    "sk": "IMPORTANT: Always respond in Slovak language (slovensky). All text in summary and key_points must be in Slovak."
+}
+
+HTML_FORMAT_INSTRUCTION = (
+    "\n\n## CONTENT FORMAT:\n"
+    "The source content is provided as cleaned HTML with semantic structure preserved.\n"
+    "- Use HTML tags (h1-h6, ul, ol, table, etc.) to understand information hierarchy\n"
+    "- Pay attention to headings for main topics and structure\n"
+    "- Tables contain structured data - extract them carefully\n"
+    "- Links (<a>) show relationships between topics"
+)
+
+ANSWER_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "ai_response",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "summary": {
+                    "type": "string",
+                    "description": "Direct answer to the user's question based on the provided sources"
+                },
+                "key_points": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of 3-5 key points that support the answer or are relevant to the question"
+                },
+                "sources_used": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of source URLs used to generate the summary"
+                },
+                "confidence": {
+                    "type": "string",
+                    "enum": ["high", "medium", "low"],
+                    "description": "Confidence level in the answer based on source quality"
+                }
+            },
+            "required": ["summary", "key_points", "sources_used", "confidence"],
+            "additionalProperties": False
+        }
+    }
+}
+
+#session follow-ups and keyword fast-path queries skip query generation, so the answer request also screens them
+SCREEN_INSTRUCTION = (
+    "\n\n## INPUT SCREENING:\n"
+    "The user question has not been checked yet. Apply the check below to the "
+    "USER QUESTION only (not to the sources) and set is_appropriate and reason. "
+    "If it is inappropriate, leave summary and key_points empty and set confidence to low.\n\n"
+    + APPROPRIATENESS_CHECK.rstrip()
+)
+
+SCREENED_ANSWER_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "screened_ai_response",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                **ANSWER_RESPONSE_FORMAT["json_schema"]["schema"]["properties"],
+                "is_appropriate": {
+                    "type": "boolean",
+                    "description": "Whether the user question is appropriate to answer"
+                },
+                "reason": {
+                    "type": "string",
+                    "description": "Reason if inappropriate, empty otherwise"
+                }
+            },
+            "required": ["summary", "key_points", "sources_used", "confidence", "is_appropriate", "reason"],
+            "additionalProperties": False
+        }
+    }
+}
+
+FINDINGS_SYSTEM_PROMPT = (
+    "You are a fact extractor for a company's AI search system. "
+    "You receive ONE source and a user question.\n\n"
+
+    "## YOUR TASK:\n"
+    "1. Extract only facts from the source that help answer the question\n"
+    "2. Keep numbers, dates, names, prices and contact details exactly as written\n"
+    "3. Keep each finding short and self-contained, in the language of the source\n"
+    "4. Never add information that is not in the source\n"
+    "5. If the source says nothing useful about the question, set relevant=false and return no findings"
+)
+
+FINDINGS_HTML_INSTRUCTION = "\n\nThe content is cleaned HTML, use its structure (headings, lists, tables) to read it."
+
+FINDINGS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "source_findings",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "relevant": {
+                    "type": "boolean",
+                    "description": "Whether the source contains information relevant to the question"
+                },
+                "findings": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Facts from the source relevant to the question"
+                }
+            },
+            "required": ["relevant", "findings"],
+            "additionalProperties": False
+        }
+    }
+}
+
+#precompiled system messages per (domain, language, format) - built once, never mutated
+@lru_cache(maxsize=64)
+def query_system_message(company, language="auto") -> Dict:
+    lang_instruction = QUERY_LANGUAGES.get(language, QUERY_LANGUAGES["auto"])
+    return {
+        "role": "system",
+        "content": f"{QUERY_SYSTEM_PROMPT}\n\n## REQUEST SETTINGS:\nCompany: {company}\nLanguage: {lang_instruction}"
+    }
+
+@lru_cache(maxsize=64)
+def answer_system_message(company, language="auto", format="text", screen=False) -> Dict:
+    lang_instruction = ANSWER_LANGUAGES.get(language, ANSWER_LANGUAGES["auto"])
+    html_instruction = HTML_FORMAT_INSTRUCTION if format == "html" else ""
+    screen_instruction = SCREEN_INSTRUCTION if screen else ""
+    return {
+        "role": "system",
+        "content": f"{ANSWER_SYSTEM_PROMPT}{html_instruction}{screen_instruction}\n\n## REQUEST SETTINGS:\nCompany: {company}\nLanguage: {lang_instruction}"
+    }
+
+@lru_cache(maxsize=64)
+def findings_system_message(company, format="text") -> Dict:
+    html_instruction = FINDINGS_HTML_INSTRUCTION if format == "html" else ""
+    return {
+        "role": "system",
+        "content": f"{FINDINGS_SYSTEM_PROMPT}{html_instruction}\n\n## REQUEST SETTINGS:\nCompany: {company}"
+    }
+
+#token counting - exact with tiktoken if installed, otherwise ~4 characters per token
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    global _encoding, tiktoken
+    if not text:
+        return 0
+    if tiktoken is not None and _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            #encoding files unavailable (offline) - stay with the estimate
+            tiktoken = None
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+#the static sections repeat on every request, count them once
+@lru_cache(maxsize=256)
+def _count_static_tokens(text: str) -> int:
+    return count_tokens(text)
+
+#count tokens per prompt section and report them for this request
+def report_prompt_tokens(label: str, system: str, **sections) -> Dict[str, int]:
+    counts = {"system": _count_static_tokens(system)}
+    for name, text in sections.items():
+        #a section may be passed as an already known token count
+        counts[name] = text if isinstance(text, int) else count_tokens(text)
+    counts["total"] = sum(counts.values())
+    print(f"[*] {label} prompt tokens: " + ", ".join(f"{name}={count}" for name, count in counts.items()))
+    return counts
+
+#send a chat completion request and return the message content
+@traced("ai_request")
+def request_completion(payload: Dict, purpose: str = None) -> str:
+    api_key = os.getenv("AI_API_KEY")
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+    if purpose:
+        print(f"[*] Sending request to AI API for {purpose}...")
+    response = requests.post(AI_API_URL, headers=headers, json=payload)
+    try:
+        response.raise_for_status()
+    except requests.HTTPError as e:
+        print(f"[!] AI API request failed: {e}")
+        print(f"Response content: {response.text}")
+        raise
+
+    return response.json()["choices"][0]["message"]["content"]
+
 #generate search queries based on user input
+@traced("generate_search_queries")
 def generate_search_queries(user_input, language="auto", max_input_length=500) -> List[str]:
     api_key = os.getenv("AI_API_KEY")
     if not api_key:
@@ -32,121 +432,17 @@ def generate_search_queries(user_input, language="auto", max_input_length=500) -
     user_input = sanitize_user_input(user_input)
     user_input = user_input[:max_input_length]
 
-    url = "https://chetty-api.mateides.com/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    lang_map = {
-        "cs": "Generate all queries in Czech language.",
-        "en": "Generate all queries in English language.",
-        "sk": "Generate all queries in Slovak language.",
-        "auto": "Generate queries in the same language as the user input (Czech if user writes in Czech, English if English, etc.)."
-    }
-    lang_instruction = lang_map.get(language, lang_map["auto"])
-    
+    system_message = query_system_message(company, language)
     payload = {
         "messages": [
-            {
-                "role": "system",
-                "content": (
-                    f"You are an expert search query generator for {company}'s AI search system. "
-                    f"Your task is to transform user questions into effective Google search queries.\n\n"
-                    
-                    f"## CORE RULES:\n"
-                    f"1. Generate 2-4 diverse queries targeting DIFFERENT information angles\n"
-                    f"2. Always include '{company}' in each query (unless already present)\n"
-                    f"3. Use natural language phrases that appear on real websites\n"
-                    f"4. Think like a search engine: use terms from page titles, headings, meta descriptions\n"
-                    f"5. {lang_instruction}\n\n"
-                    
-                    f"## EFFECTIVE QUERY PATTERNS:\n"
-                    f"Different information sources: official page, contact page, about page, FAQ\n"
-                    f"Related context: location-based, service-based, category-based\n\n"
-                    
-                    f"## QUERY GENERATION EXAMPLES:\n"
-                    f"User: 'Do you have branch offices?'\n"
-                    f"→ ['{company} branches contact',  # Official contact info\n"
-                    f"    '{company} where to find us',  # Natural FAQ phrase\n"
-                    f"    '{company} branch network map']  # Geographic coverage\n\n"
-                    
-                    f"User: 'What are your opening hours?'\n"
-                    f"→ ['{company} opening hours',     # Direct term\n"
-                    f"    '{company} weekend hours',      # Specific aspect\n"
-                    f"    '{company} contact working hours']  # Contact page context\n\n"
-                    
-                    f"User: 'pricing for premium plan'\n"
-                    f"→ ['{company} pricing premium plan',   # Pricing page term\n"
-                    f"    '{company} premium price monthly',  # Specific detail\n"
-                    f"    '{company} premium package cost']  # Natural question\n\n"
-                    
-                    f"User: 'How do I contact support?'\n"
-                    f"→ ['{company} customer support',  # Official support page\n"
-                    f"    '{company} technical help email',      # Specific channel\n"
-                    f"    '{company} helpdesk chat']              # Alternative channel\n\n"
-                    
-                    f"## APPROPRIATENESS CHECK:\n"
-                    f"Mark as INAPPROPRIATE (is_appropriate=false) if the input:\n"
-                    f"- Requests personal/confidential data (passwords, private info, internal documents)\n"
-                    f"- Contains illegal/harmful content (hacking, violence, discrimination)\n"
-                    f"- Asks for technical internals (SQL queries, API keys, source code)\n"
-                    f"- Is completely off-topic, irrelevant to {company} or spam\n\n"
-                    f"Mark as APPROPRIATE (is_appropriate=true) if the input:\n"
-                    f"- Asks about company info, products, services, contact details\n"
-                    f"- Seeks public information (pricing, locations, support)\n"
-                    f"- Is a general customer inquiry\n\n"
-                    
-                    f"## SPECIAL CASES:\n"
-                    f"- If input is already a search query (keywords only), use it as-is and add 1-2 variations\n"
-                    f"- If question has multiple sub-questions, generate queries for each part\n"
-                    f"- For vague questions, create broader queries to capture relevant results"
-                )
-            },
-            {
-                "role": "user",
-                "content": user_input
-            }
+            system_message,
+            {"role": "user", "content": user_input}
         ],
-        "response_format": {
-            "type": "json_schema",
-            "json_schema": {
-                "name": "search_queries",
-                "strict": True,
-                "schema": {
-                    "type": "object",
-                    "properties": {
-                        "queries": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "List of search queries"
-                        },
-                        "is_appropriate": {
-                            "type": "boolean",
-                            "description": "Whether the input is appropriate for searching"
-                        },
-                        "reason": {
-                            "type": "string",
-                            "description": "Reason if inappropriate, empty otherwise"
-                        }
-                    },
-                    "required": ["queries", "is_appropriate", "reason"],
-                    "additionalProperties": False
-                }
-            }
-        }
+        "response_format": QUERY_RESPONSE_FORMAT
     }
+    report_prompt_tokens("Query generation", system_message["content"], question=user_input)
 
-    print("[*] Sending request to AI API for queries...")
-    response = requests.post(url, headers=headers, json=payload)
-    try:
-        response.raise_for_status()
-    except requests.HTTPError as e:
-        print(f"[!] AI API request failed: {e}")
-        print(f"Response content: {response.text}")
-        raise
-
-    result_content = response.json()["choices"][0]["message"]["content"]
+    result_content = request_completion(payload, "queries")
     
     parsed_result = SearchQueries(**json.loads(result_content))
     
@@ -156,31 +452,139 @@ def generate_search_queries(user_input, language="auto", max_input_length=500) -
     
     return parsed_result.queries
 
+#collects query generation requests arriving within a short window and resolves them with one request
+class QueryBatcher:
+    def __init__(self, window: float = 0.05, max_batch: int = 8):
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = {}
+        self.condition = threading.Condition()
+
+    #blocks until this input's queries are ready - same result as generate_search_queries
+    def submit(self, user_input: str, language: str = "auto"):
+        key = (os.getenv("TARGET_DOMAIN"), language)
+        entry = {"input": user_input, "done": threading.Event(), "result": None, "error": None}
+
+        with self.condition:
+            batch = self.pending.setdefault(key, [])
+            batch.append(entry)
+            leader = len(batch) == 1
+            if len(batch) >= self.max_batch:
+                self.condition.notify_all()
+
+        #the first request of a window waits for company, then sends the whole batch
+        if leader:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.pending[key]) >= self.max_batch, timeout=self.window)
+                batch = self.pending.pop(key)
+            self._resolve(batch, language)
+
+        entry["done"].wait()
+        if entry["error"] is not None:
+            raise entry["error"]
+        return entry["result"]
+
+    def _resolve(self, batch, language):
+        unresolved = batch
+        if len(batch) > 1:
+            try:
+                results = generate_search_queries_batch([entry["input"] for entry in batch], language)
+                unresolved = []
+                for i, entry in enumerate(batch):
+                    if i in results:
+                        entry["result"] = results[i]
+                        entry["done"].set()
+                    else:
+                        unresolved.append(entry)
+            except Exception as e:
+                print(f"[!] Batched query generation failed, falling back to single requests: {e}")
+
+        if unresolved and len(batch) > 1:
+            print(f"[*] Resolving {len(unresolved)} of {len(batch)} inputs with single requests...")
+
+        def resolve_single(entry):
+            try:
+                entry["result"] = generate_search_queries(entry["input"], language)
+            except Exception as e:
+                entry["error"] = e
+            finally:
+                entry["done"].set()
+
+        with ThreadPoolExecutor(max_workers=max(1, len(unresolved))) as executor:
+            list(executor.map(resolve_single, unresolved))
+
+#one request for several inputs - returns {position: queries or None if inappropriate}, missing positions failed
+def generate_search_queries_batch(user_inputs: List[str], language="auto", max_input_length=500) -> Dict[int, List[str]]:
+    api_key = os.getenv("AI_API_KEY")
+    if not api_key:
+        raise ValueError("[!] Missing AI API key in environment variables. Cannot generate search queries.")
+
+    company = os.getenv("TARGET_DOMAIN")
+    inputs = [sanitize_user_input(user_input)[:max_input_length] for user_input in user_inputs]
+    numbered = "\n".join(f"[{i}] {user_input}" for i, user_input in enumerate(inputs, 1))
+
+    system_message = query_system_message(company, language)
+    payload = {
+        "messages": [
+            system_message,
+            {"role": "user", "content": QUERY_BATCH_INSTRUCTION + numbered}
+        ],
+        "response_format": QUERY_BATCH_RESPONSE_FORMAT
+    }
+    report_prompt_tokens(f"Batched query generation ({len(inputs)} inputs)", system_message["content"], inputs=numbered)
+
+    result_content = request_completion(payload, f"{len(inputs)} batched queries")
+    parsed_result = SearchQueriesBatch(**json.loads(result_content))
+
+    results = {}
+    for item in parsed_result.results:
+        position = item.index - 1
+        if 0 <= position < len(inputs) and position not in results:
+            if not item.is_appropriate:
+                print(f"[!] Inappropriate input detected: {item.reason}")
+            results[position] = item.queries if item.is_appropriate else None
+    return results
+
+_query_batcher = None
+_batcher_lock = threading.Lock()
+
+#batched drop-in replacement for generate_search_queries, for many concurrent callers
+def generate_search_queries_batched(user_input, language="auto") -> List[str]:
+    global _query_batcher
+    with _batcher_lock:
+        if _query_batcher is None:
+            _query_batcher = QueryBatcher(
+                window=float(os.getenv("QUERY_BATCH_WINDOW_MS", "50")) / 1000,
+                max_batch=int(os.getenv("QUERY_BATCH_MAX", "8"))
+            )
+    return _query_batcher.submit(user_input, language)
+
 #format structured data for AI consumption
-def format_sources(data_list: List[Dict]) -> str:
-    formatted_sources = []
-    
+#sources are written one by one into a single buffer, each sanitized only while it is written
+def format_sources(data_list: List[Dict], buffer: io.StringIO = None) -> str:
+    out = buffer if buffer is not None else io.StringIO()
+
     for idx, source in enumerate(data_list, 1):
-        content = source.get('content', '')
-        
-        # Sanitize scraped content
-        content = sanitize_scraped_content(content)
-        
-        
-        formatted_sources.append(
+        source = as_record(source)
+        if idx > 1:
+            out.write("\n")
+        out.write(
             f"[Source {idx}]\n"
             f"URL: {source.get('url', 'Unknown')}\n"
             f"Title: {source.get('title', 'Untitled')}\n"
             f"Type: {source.get('type', 'unknown')}\n"
             f"Content Length: {source.get('length', 0)} characters\n"
-            f"Content:\n{content}\n"
-            f"{'=' * 80}\n"
+            f"Content:\n"
         )
-    
-    return "\n".join(formatted_sources)
+        out.write(source.sanitized())
+        out.write(f"\n{'=' * 80}\n")
+
+    return out.getvalue() if buffer is None else ""
 
 #process data with AI to generate structured response
-def process_with_ai(data, user_query="", language="auto", format="text"):
+#screen_input also checks the question's appropriateness in the same request (ScreenedAIResponse)
+@traced("process_with_ai")
+def process_with_ai(data, user_query="", language="auto", format="text", screen_input=False):
     api_key = os.getenv("AI_API_KEY")
     company = os.getenv("TARGET_DOMAIN")
 
@@ -190,129 +594,123 @@ def process_with_ai(data, user_query="", language="auto", format="text"):
     # Sanitize user query
     user_query = sanitize_user_input(user_query)
 
-    url = "https://chetty-api.mateides.com/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    language_instructions = {
-        "auto": "IMPORTANT: Detect the language from the user query and respond in that language. All text in summary and key_points must be in the detected language.",
-        "cs": "IMPORTANT: Always respond in Czech language (česky). All text in summary and key_points must be in Czech.",
-        "en": "IMPORTANT: Always respond in English. All text in summary and key_points must be in English.",
-        "sk": "IMPORTANT: Always respond in Slovak language (slovensky). All text in summary and key_points must be in Slovak."
-    }
-    
-    lang_instruction = language_instructions.get(language, language_instructions["auto"])
-    
-    formatted_data = format_sources(data)
-    
-    #detect if we're working with HTML structured content
-    if format == "html":
-        html_instruction = {
-            "\n\n## CONTENT FORMAT:\n"
-            "The source content is provided as cleaned HTML with semantic structure preserved.\n"
-            "- Use HTML tags (h1-h6, ul, ol, table, etc.) to understand information hierarchy\n"
-            "- Pay attention to headings for main topics and structure\n"
-            "- Tables contain structured data - extract them carefully\n"
-            "- Links (<a>) show relationships between topics\n"
-        }
-    else:
-        html_instruction = ""
-    
+    #the whole user message is built in one buffer instead of formatting sources and copying them again
+    prompt = io.StringIO()
+    prompt.write("## AVAILABLE SOURCES:\n")
+    format_sources(data, prompt)
+    question = f"\n\n## USER QUESTION:\n{user_query}"
+    prompt.write(question)
+    user_content = prompt.getvalue()
+    prompt.close()
+
+    system_message = answer_system_message(company, language, format, screen_input)
     payload = {
         "messages": [
-            {
-                "role": "system",
-                "content": (
-                    f"You are {company}'s AI assistant. Your role is to provide accurate, helpful answers based solely on the provided sources.\n\n"
-                    
-                    f"## YOUR TASK:\n"
-                    f"Analyze the sources and answer the user's question with precision and clarity.\n\n"
-                    
-                    f"## ANSWER GUIDELINES:\n"
-                    f"1. **Use ONLY information from the provided sources** - never add external knowledge\n"
-                    f"2. **Cite sources** using format '[Source X]' when referencing specific information\n"
-                    f"3. **Be concise** - provide direct answers, avoid unnecessary elaboration\n"
-                    f"4. **Be honest** - if sources don't contain the answer, clearly state this\n"
-                    f"5. {lang_instruction}\n"
-                    f"{html_instruction}\n"
-                    
-                    f"## KEY POINTS EXTRACTION:\n"
-                    f"- Extract 3-5 key points (fewer if information is limited, more only if critical)\n"
-                    f"- Include relevant numbers, dates, or specifics when available\n\n"
-                    
-                    f"## CONFIDENCE ASSESSMENT:\n"
-                    f"Set confidence level based on:\n"
-                    f"- **HIGH**: Multiple sources confirm the answer, information is detailed and recent\n"
-                    f"- **MEDIUM**: Answer found but limited sources, some gaps in information, or slightly outdated\n"
-                    f"- **LOW**: Minimal relevant information, sources tangentially related, or conflicting data\n\n"
-                    
-                    f"## HANDLING EDGE CASES:\n"
-                    f"- **Conflicting sources**: Mention both viewpoints, cite each source, set confidence to MEDIUM or LOW\n"
-                    f"- **No relevant info**: State clearly 'The provided sources do not contain information about...'\n"
-                    f"- **Partial answer**: Provide what you can, explicitly note what's missing\n"
-                    f"- **Outdated info**: Mention if sources appear old, adjust confidence accordingly\n\n"
-                    
-                    f"## SOURCES_USED FIELD:\n"
-                    f"Include only the URLs of sources you actually referenced in your answer (not all provided sources)."
-                )
-            },
+            system_message,
             {
                 "role": "user",
-                "content": f"## AVAILABLE SOURCES:\n{formatted_data}\n\n## USER QUESTION:\n{user_query}"
+                "content": user_content
             }
         ],
-        "response_format": {
-            "type": "json_schema",
-            "json_schema": {
-                "name": "ai_response",
-                "strict": True,
-                "schema": {
-                    "type": "object",
-                    "properties": {
-                        "summary": {
-                            "type": "string",
-                            "description": "Direct answer to the user's question based on the provided sources"
-                        },
-                        "key_points": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "List of 3-5 key points that support the answer or are relevant to the question"
-                        },
-                        "sources_used": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "List of source URLs used to generate the summary"
-                        },
-                        "confidence": {
-                            "type": "string",
-                            "enum": ["high", "medium", "low"],
-                            "description": "Confidence level in the answer based on source quality"
-                        }
-                    },
-                    "required": ["summary", "key_points", "sources_used", "confidence"],
-                    "additionalProperties": False
-                }
-            }
-        }
+        "response_format": SCREENED_ANSWER_RESPONSE_FORMAT if screen_input else ANSWER_RESPONSE_FORMAT
     }
+    #sources are counted as the rest of the message - no second copy of them is made
+    question_tokens = count_tokens(question)
+    report_prompt_tokens(
+        "Summarization", system_message["content"],
+        sources=max(count_tokens(user_content) - question_tokens, 0), question=question_tokens
+    )
 
-    print("[*] Sending request to AI API for summarization...")
-    response = requests.post(url, headers=headers, json=payload)
-    try:
-        response.raise_for_status()
-    except requests.HTTPError as e:
-        print(f"[!] AI API request failed: {e}")
-        print(f"Response content: {response.text}")
-        raise
-    
-    result_content = response.json()["choices"][0]["message"]["content"]
-    
-    parsed_result = AIResponse(**json.loads(result_content))
+    result_content = request_completion(payload, "summarization")
     
+    parsed_result = (ScreenedAIResponse if screen_input else AIResponse)(**json.loads(result_content))
+
     return parsed_result
 
+#map step: ask what a single source says about the question
+@traced("extract_source_findings")
+def extract_source_findings(source: Dict, user_query: str, format="text") -> SourceFindings:
+    api_key = os.getenv("AI_API_KEY")
+    company = os.getenv("TARGET_DOMAIN")
+
+    if not api_key:
+        raise ValueError("[!] Missing AI API key in environment variables. Cannot request AI processing.")
+
+    content = as_record(source).sanitized()
+    source_section = (
+        f"## SOURCE:\n"
+        f"URL: {source.get('url', 'Unknown')}\n"
+        f"Title: {source.get('title', 'Untitled')}\n"
+        f"Content:\n{content}\n\n"
+    )
+    question = f"## USER QUESTION:\n{user_query}"
+
+    system_message = findings_system_message(company, format)
+    payload = {
+        "messages": [
+            system_message,
+            {
+                "role": "user",
+                "content": source_section + question
+            }
+        ],
+        "response_format": FINDINGS_RESPONSE_FORMAT
+    }
+    report_prompt_tokens("Findings", system_message["content"], source=source_section, question=question)
+
+    result_content = request_completion(payload)
+
+    return SourceFindings(**json.loads(result_content))
+
+#process data with AI in two steps: concurrent per-source extraction, then one small final answer
+@traced("process_with_ai_map_reduce")
+def process_with_ai_map_reduce(data, user_query="", language="auto", format="text", max_workers=4, screen_input=False):
+    user_query = sanitize_user_input(user_query)
+
+    if not data:
+        return process_with_ai(data, user_query, language, format, screen_input)
+
+    def extract(source):
+        try:
+            return extract_source_findings(source, user_query, format)
+        except Exception as e:
+            print(f"[!] Extraction failed for {source.get('url', 'Unknown')}: {e}")
+            return None
+
+    print(f"[*] Extracting findings from {len(data)} sources (max {max_workers} parallel requests)...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(bind(extract), data))
+
+    #nothing was extracted at all - fall back to the single request
+    if all(result is None for result in results):
+        print("[!] All extraction requests failed, falling back to single request summarization...")
+        return process_with_ai(data, user_query, language, format, screen_input)
+
+    #keep every source in place so [Source X] numbering and URLs match the original list
+    reduced = []
+    for source, result in zip(data, results):
+        if result is None:
+            #failed extraction - pass the original source through
+            reduced.append(as_record(source))
+            continue
+        if result.relevant and result.findings:
+            content = "\n".join(f"- {finding}" for finding in result.findings)
+        else:
+            content = "(no relevant information)"
+
+        reduced.append(SourceRecord(
+            source.get('url', 'Unknown'),
+            source.get('type', 'unknown'),
+            source.get('title', 'Untitled'),
+            content
+        ))
+
+    relevant_count = sum(1 for result in results if result and result.relevant and result.findings)
+    print(f"[+] {relevant_count}/{len(data)} sources contain relevant findings")
+
+    mixed_format = format if any(result is None for result in results) else "text"
+    return process_with_ai(reduced, user_query, language, mixed_format, screen_input)
+
 #sanitize user input - remove potentially harmful characters
 def sanitize_user_input(text: str) -> str:
     if not text:
@@ -330,20 +728,3 @@ def sanitize_user_input(text: str) -> str:
     text = ' '.join(text.split())
     
     return text.strip()
-
-#sanitize scraped content - remove potentially harmful or useless content
-def sanitize_scraped_content(text: str) -> str:
-    if not text:
-        return ""
-    
-    # Remove control characters
-    text = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f-\x9f]', '', text)
-    
-    # Remove excessive whitespace but preserve structure
-    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)  # Max 2 consecutive newlines
-    text = re.sub(r' +', ' ', text)  # Multiple spaces to single space
-    
-    # Remove common noise patterns
-    text = re.sub(r'(cookies?|gdpr|privacy policy)\s+(accept|consent|agree)', '', text, flags=re.IGNORECASE)
-    
-    return text.strip()
\ No newline at end of file
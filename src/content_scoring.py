@@ -0,0 +1,238 @@
+import os
+import re
+import threading
+import hashlib
+from collections import OrderedDict, defaultdict
+from urllib.parse import urlparse
+from bs4 import NavigableString, Tag
+from dotenv import load_dotenv
+
+load_dotenv()
+
+#class/id hints - matched as whole words inside class and id attributes
+POSITIVE_HINTS = re.compile(
+    r"(?:^|[-_\s])(article|body|content|entry|main|page|post|text|blog|story|detail|documentation)(?:$|[-_\s])", re.I
+)
+NEGATIVE_HINTS = re.compile(
+    r"(?:^|[-_\s])(nav|navbar|menu|megamenu|footer|header|sidebar|cookie|cookies|consent|gdpr|banner|popup|modal|"
+    r"share|social|comments?|related|breadcrumbs?|advert|ads|promo|newsletter|widget|login|subscribe|toolbar)(?:$|[-_\s])", re.I
+)
+
+#elements whose text counts towards the score of their parent blocks
+SCORED_TAGS = {'p', 'pre', 'td', 'li', 'blockquote', 'h2', 'h3', 'dd'}
+#containers that may be dropped as junk inside the chosen region
+JUNK_CANDIDATE_TAGS = {'div', 'section', 'ul', 'ol', 'form', 'table', 'p', 'span', 'dl'}
+
+MIN_SCORED_TEXT = 25         #shorter paragraphs carry no signal
+MIN_CONTENT_TEXT = 140       #a winner with less text than this is not trusted
+SIBLING_SCORE_RATIO = 0.2    #siblings scoring this much of the winner are part of the content
+WRAPPER_TEXT_RATIO = 1.1     #a parent adding less text than this is just a wrapper
+MAX_LINK_DENSITY = 0.6       #blocks with more link text than this are menus or link farms
+MIN_REPEAT_TEXT = 40         #shorter blocks are too generic to fingerprint
+MAX_REPEAT_TEXT = 5000       #boilerplate blocks are short, large containers are skipped
+MAX_REPEAT_SHARE = 0.5       #a block holding this much of the region's text is the content itself
+
+#fingerprints of blocks seen on earlier pages of the same site: host -> {fingerprint: page count}
+#pages are told apart by their content, so URL variants of one page (http/https, trailing slash,
+#tracking parameters) count once
+REPEAT_MIN_PAGES = int(os.getenv("REPEAT_BLOCK_MIN_PAGES", "2"))
+MAX_TRACKED_HOSTS = 100
+MAX_FINGERPRINTS_PER_HOST = 5000
+_site_blocks = OrderedDict()
+_site_pages = {}   #host -> fingerprints of the content regions already counted
+_site_lock = threading.Lock()
+
+#tags under root with one of the names, in document order
+#(a plain walk - bs4's find_all filter matching dominates the cost on large pages)
+def tags_named(root, names) -> list:
+    return [element for element in root.descendants if isinstance(element, Tag) and element.name in names]
+
+#text and link-text length of every element under root, in one pass over the text nodes
+def measure_text(root):
+    text_len = defaultdict(int)
+    link_len = defaultdict(int)
+    stop = root.parent
+    for string in root.descendants:
+        #comments, CDATA and doctype are NavigableString subclasses
+        if type(string) is not NavigableString:
+            continue
+        length = len(string.strip())
+        if not length:
+            continue
+        ancestors = []
+        in_link = False
+        parent = string.parent
+        while parent is not None and parent is not stop:
+            if parent.name == 'a':
+                in_link = True
+            ancestors.append(id(parent))
+            parent = parent.parent
+        for key in ancestors:
+            text_len[key] += length
+            if in_link:
+                link_len[key] += length
+    return text_len, link_len
+
+def link_density(element, text_len, link_len) -> float:
+    total = text_len.get(id(element), 0)
+    return link_len.get(id(element), 0) / total if total else 0.0
+
+#+25 for content-like class/id names, -25 for boilerplate ones
+def class_weight(element) -> int:
+    attrs = element.attrs or {}
+    hints = ' '.join(attrs.get('class') or []) + ' ' + (attrs.get('id') or '')
+    if not hints.strip():
+        return 0
+    weight = 0
+    if NEGATIVE_HINTS.search(hints):
+        weight -= 25
+    if POSITIVE_HINTS.search(hints):
+        weight += 25
+    return weight
+
+#readability-style scoring: paragraphs vote for their parent and grandparent,
+#then candidates are weighted by class hints and penalized by link density
+def score_candidates(root, text_len, link_len) -> dict:
+    scores = {}
+    elements = {}
+    for paragraph in tags_named(root, SCORED_TAGS):
+        length = text_len.get(id(paragraph), 0)
+        if length < MIN_SCORED_TEXT:
+            continue
+        score = 1 + paragraph.get_text().count(',') + min(length // 100, 3)
+        parent = paragraph.parent
+        for share in (1.0, 0.5):
+            if parent is None or parent.name is None or parent.name == '[document]':
+                break
+            key = id(parent)
+            if key not in scores:
+                scores[key] = class_weight(parent)
+                elements[key] = parent
+            scores[key] += score * share
+            parent = parent.parent
+
+    return {
+        key: (elements[key], score * (1 - link_density(elements[key], text_len, link_len)))
+        for key, score in scores.items()
+    }
+
+#best scoring block; while sibling subtrees score comparably (more sections, more tables)
+#or the parent only wraps it (table around tbody), the parent is taken instead
+def pick_content(root, text_len, link_len):
+    candidates = score_candidates(root, text_len, link_len)
+    if not candidates:
+        return None
+    element, best = max(candidates.values(), key=lambda item: item[1])
+    if best <= 0 or text_len.get(id(element), 0) < MIN_CONTENT_TEXT:
+        return None
+
+    #best candidate score anywhere in each element's subtree
+    subtree_best = {}
+    for candidate, score in candidates.values():
+        node = candidate
+        while node is not None and node is not root.parent:
+            key = id(node)
+            if subtree_best.get(key, float('-inf')) >= score:
+                break
+            subtree_best[key] = score
+            node = node.parent
+
+    threshold = best * SIBLING_SCORE_RATIO
+    while element is not root:
+        parent = element.parent
+        if parent is None or parent.name in (None, '[document]'):
+            break
+        wrapper = text_len.get(id(parent), 0) <= text_len.get(id(element), 0) * WRAPPER_TEXT_RATIO
+        merged = wrapper or any(
+            sibling is not element and subtree_best.get(id(sibling), 0) >= threshold
+            for sibling in parent.children
+        )
+        if not merged:
+            break
+        element = parent
+    return element
+
+#drop menus, link farms and hinted boilerplate left inside the content region
+def remove_junk(content, text_len, link_len):
+    for element in tags_named(content, JUNK_CANDIDATE_TAGS):
+        if element.decomposed:
+            continue
+        if class_weight(element) < 0:
+            element.decompose()
+        elif element.name != 'p' and text_len.get(id(element), 0) and link_density(element, text_len, link_len) > MAX_LINK_DENSITY:
+            element.decompose()
+
+def _fingerprint(element) -> str:
+    text = ' '.join(element.get_text(separator=' ').split()).lower()
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+#drop blocks already seen on other pages of the same site (headers, teasers, banners
+#without telling class names), then remember this page's blocks
+def remove_repeated_blocks(content, url, text_len):
+    host = urlparse(url).netloc.lower()
+    if not host:
+        return
+
+    region_len = text_len.get(id(content), 0)
+    blocks = {}
+    for element in tags_named(content, JUNK_CANDIDATE_TAGS):
+        length = text_len.get(id(element), 0)
+        if MIN_REPEAT_TEXT <= length <= MAX_REPEAT_TEXT and length <= region_len * MAX_REPEAT_SHARE:
+            blocks[id(element)] = (element, _fingerprint(element))
+    page = _fingerprint(content)
+
+    with _site_lock:
+        seen = _site_blocks.get(host)
+        pages = _site_pages.setdefault(host, set())
+        is_new_page = page not in pages
+        repeated = {
+            key for key, (_, fingerprint) in blocks.items()
+            if seen is not None and seen.get(fingerprint, 0) >= REPEAT_MIN_PAGES
+        }
+
+        #the same page fetched again (under any URL) must not count as another page of the site
+        if is_new_page:
+            pages.add(page)
+            if len(pages) > MAX_FINGERPRINTS_PER_HOST:
+                pages.pop()
+            if seen is None:
+                seen = OrderedDict()
+                _site_blocks[host] = seen
+            for fingerprint in {fingerprint for _, fingerprint in blocks.values()}:
+                seen[fingerprint] = seen.get(fingerprint, 0) + 1
+                seen.move_to_end(fingerprint)
+            while len(seen) > MAX_FINGERPRINTS_PER_HOST:
+                seen.popitem(last=False)
+        _site_blocks.move_to_end(host)
+        while len(_site_blocks) > MAX_TRACKED_HOSTS:
+            evicted, _ = _site_blocks.popitem(last=False)
+            _site_pages.pop(evicted, None)
+
+    removed = 0
+    for key in repeated:
+        element = blocks[key][0]
+        if not element.decomposed:
+            element.decompose()
+            removed += 1
+    if removed:
+        print(f"[*] Dropped {removed} block(s) repeated across pages of {host}")
+
+#forget the per-site fingerprints (tests and long running processes)
+def reset_site_blocks():
+    with _site_lock:
+        _site_blocks.clear()
+        _site_pages.clear()
+
+#main content region of an already cleaned soup; falls back to main/article/body
+def select_main_content(soup, url: str = None):
+    root = soup.find('body') or soup
+    text_len, link_len = measure_text(root)
+
+    content = pick_content(root, text_len, link_len)
+    if content is None:
+        content = soup.find('main') or soup.find('article') or root
+
+    remove_junk(content, text_len, link_len)
+    if url:
+        remove_repeated_blocks(content, url, text_len)
+    return content
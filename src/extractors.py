@@ -0,0 +1,261 @@
+import io
+import os
+import time
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Callable
+from dotenv import load_dotenv
+import pdfplumber
+from profiling import bind, span, traced
+
+load_dotenv()
+
+#registered document extractors by type name
+EXTRACTORS: Dict[str, Dict] = {}
+
+#extraction runs here so a slow document never blocks the caller
+#a worker stuck past its deadline (inside a C call) keeps its slot, so size this for concurrent requests
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("EXTRACTOR_WORKERS", "4")), thread_name_prefix="extractor")
+
+#how long a job may wait for a free worker before it is given up
+QUEUE_TIMEOUT = float(os.getenv("EXTRACTOR_QUEUE_TIMEOUT", "30"))
+
+#OOXML / ODF namespaces
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+S_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+TEXT_NS = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+#raised inside extractors when the time budget runs out
+class ExtractionDeadline(Exception):
+    pass
+
+#collects extracted text up to a character limit and checks the deadline
+class TextBuffer:
+    def __init__(self, max_chars: int, deadline: float):
+        self.parts = []
+        self.size = 0
+        self.max_chars = max_chars
+        self.deadline = deadline
+        self.truncated = False
+
+    def append(self, text: str) -> bool:
+        if time.monotonic() > self.deadline:
+            raise ExtractionDeadline()
+        if not text:
+            return True
+        remaining = self.max_chars - self.size
+        if remaining <= 0:
+            self.truncated = True
+            return False
+        if len(text) > remaining:
+            text = text[:remaining]
+            self.truncated = True
+        self.parts.append(text)
+        self.size += len(text)
+        return not self.truncated
+
+    def text(self, separator: str = '\n') -> str:
+        return separator.join(self.parts)
+
+#register an extractor for a document type
+def register_extractor(name: str, content_types=(), extensions=()):
+    def decorator(func: Callable):
+        EXTRACTORS[name] = {
+            "func": func,
+            "content_types": tuple(content_types),
+            "extensions": tuple(extensions)
+        }
+        return func
+    return decorator
+
+#file extensions any registered extractor can read
+def supported_extensions() -> tuple:
+    return tuple(ext for entry in EXTRACTORS.values() for ext in entry["extensions"])
+
+#detect document type from magic bytes first, then from Content-Type (None means HTML / unknown)
+def detect_document_type(content: bytes, content_type: str = "") -> Optional[str]:
+    content_type = (content_type or "").lower()
+
+    if content[:4] == b'%PDF':
+        return "pdf"
+
+    if content[:4] == b'PK\x03\x04':
+        try:
+            with zipfile.ZipFile(io.BytesIO(content)) as archive:
+                names = set(archive.namelist())
+                if "word/document.xml" in names:
+                    return "docx"
+                if "xl/workbook.xml" in names:
+                    return "xlsx"
+                if "mimetype" in names:
+                    mimetype = archive.read("mimetype").decode('ascii', 'ignore').strip()
+                    if mimetype == "application/vnd.oasis.opendocument.text":
+                        return "odt"
+        except zipfile.BadZipFile:
+            pass
+        return None
+
+    for name, entry in EXTRACTORS.items():
+        if any(ct in content_type for ct in entry["content_types"]):
+            return name
+
+    return None
+
+#run a registered extractor off the main thread with size and time limits
+#extra keyword options are passed to the extractor (e.g. max_pages for PDF)
+def extract_document(content: bytes, doc_type: str, timeout: float = 10, max_size_mb: int = 10, max_chars: int = 200000, **options) -> Optional[str]:
+    entry = EXTRACTORS.get(doc_type)
+    if entry is None:
+        print(f"[!] No extractor registered for {doc_type}")
+        return None
+
+    size_mb = len(content) / (1024 * 1024)
+    if size_mb > max_size_mb:
+        print(f"[!] {doc_type.upper()} too large: {size_mb:.1f}MB (max {max_size_mb}MB)")
+        return None
+
+    #the time budget starts when a worker picks the job up, queueing does not count against it
+    started = {"event": threading.Event()}
+    future = _executor.submit(bind(_run_extractor), entry["func"], content, max_chars, timeout, doc_type, options, started)
+    if not started["event"].wait(QUEUE_TIMEOUT):
+        if future.cancel():
+            print(f"[!] {doc_type.upper()} extraction not started within {QUEUE_TIMEOUT}s, all extractor workers busy")
+            return None
+        started["event"].wait()
+    try:
+        #small grace period - extractors stop themselves at the deadline
+        remaining = timeout + 1 - (time.monotonic() - started["at"])
+        return future.result(timeout=max(remaining, 0))
+    except FutureTimeoutError:
+        print(f"[!] {doc_type.upper()} extraction timed out after {timeout}s")
+        return None
+
+def _run_extractor(func, content, max_chars, timeout, doc_type, options, started):
+    started["at"] = time.monotonic()
+    started["event"].set()
+    buffer = TextBuffer(max_chars, started["at"] + timeout)
+    try:
+        with span(f"extract_{doc_type}"):
+            func(content, buffer, **options)
+    except ExtractionDeadline:
+        print(f"[!] {doc_type.upper()} extraction hit the time limit, returning partial text")
+    except Exception as e:
+        print(f"[!] Error while extracting text from {doc_type.upper()}: {e}")
+        return None
+
+    if buffer.truncated:
+        print(f"[*] {doc_type.upper()} text limited to {buffer.max_chars} characters")
+
+    text = ' '.join(buffer.text().split())
+    return text or None
+
+#open an archive member, refusing suspiciously large (zip bomb) entries
+def _open_member(archive: zipfile.ZipFile, name: str, max_uncompressed_mb: int = 100):
+    info = archive.getinfo(name)
+    if info.file_size > max_uncompressed_mb * 1024 * 1024:
+        raise ValueError(f"archive member {name} too large ({info.file_size} bytes)")
+    return archive.open(info)
+
+#PDF documents
+@register_extractor("pdf", content_types=("application/pdf",), extensions=(".pdf",))
+def _extract_pdf(content: bytes, buffer: TextBuffer, max_pages: int = 50):
+    with pdfplumber.open(io.BytesIO(content)) as pdf:
+        page_count = len(pdf.pages)
+        if page_count > max_pages:
+            print(f"[*] PDF has {page_count} pages, limiting to first {max_pages}")
+
+        for i, page in enumerate(pdf.pages):
+            if i >= max_pages:
+                break
+            if not buffer.append(page.extract_text()):
+                break
+
+#Word documents - stream paragraphs from word/document.xml
+@register_extractor(
+    "docx",
+    content_types=("application/vnd.openxmlformats-officedocument.wordprocessingml.document",),
+    extensions=(".docx",)
+)
+def _extract_docx(content: bytes, buffer: TextBuffer):
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        with _open_member(archive, "word/document.xml") as xml_file:
+            paragraph = []
+            for event, elem in ET.iterparse(xml_file, events=("end",)):
+                if elem.tag == W_NS + "t" and elem.text:
+                    paragraph.append(elem.text)
+                elif elem.tag == W_NS + "tab":
+                    paragraph.append(" ")
+                elif elem.tag == W_NS + "p":
+                    if not buffer.append(''.join(paragraph)):
+                        return
+                    paragraph = []
+                    elem.clear()
+
+#Excel workbooks - shared strings, then rows of every sheet
+@register_extractor(
+    "xlsx",
+    content_types=("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",),
+    extensions=(".xlsx",)
+)
+def _extract_xlsx(content: bytes, buffer: TextBuffer, max_shared_strings: int = 100000):
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        names = archive.namelist()
+
+        shared_strings = []
+        if "xl/sharedStrings.xml" in names:
+            with _open_member(archive, "xl/sharedStrings.xml") as xml_file:
+                for event, elem in ET.iterparse(xml_file, events=("end",)):
+                    if elem.tag == S_NS + "si":
+                        shared_strings.append(''.join(t.text or '' for t in elem.iter(S_NS + "t")))
+                        elem.clear()
+                        if len(shared_strings) >= max_shared_strings:
+                            break
+
+        sheets = sorted(name for name in names if name.startswith("xl/worksheets/sheet") and name.endswith(".xml"))
+        for sheet in sheets:
+            with _open_member(archive, sheet) as xml_file:
+                for event, elem in ET.iterparse(xml_file, events=("end",)):
+                    if elem.tag != S_NS + "row":
+                        continue
+                    cells = []
+                    for cell in elem.iter(S_NS + "c"):
+                        cell_type = cell.get("t")
+                        if cell_type == "inlineStr":
+                            value = ''.join(t.text or '' for t in cell.iter(S_NS + "t"))
+                        else:
+                            v = cell.find(S_NS + "v")
+                            value = v.text if v is not None and v.text else ''
+                            if cell_type == "s" and value.isdigit() and int(value) < len(shared_strings):
+                                value = shared_strings[int(value)]
+                        if value:
+                            cells.append(value)
+                    elem.clear()
+                    if cells and not buffer.append(' | '.join(cells)):
+                        return
+
+#OpenDocument text - paragraphs and headings from content.xml
+@register_extractor("odt", content_types=("application/vnd.oasis.opendocument.text",), extensions=(".odt",))
+def _extract_odt(content: bytes, buffer: TextBuffer):
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        with _open_member(archive, "content.xml") as xml_file:
+            for event, elem in ET.iterparse(xml_file, events=("end",)):
+                if elem.tag in (TEXT_NS + "p", TEXT_NS + "h"):
+                    if not buffer.append(''.join(elem.itertext())):
+                        return
+                    elem.clear()
+
+#plain text files
+@register_extractor("text", content_types=("text/plain", "text/csv"), extensions=(".txt", ".csv"))
+def _extract_text(content: bytes, buffer: TextBuffer):
+    try:
+        text = content.decode('utf-8')
+    except UnicodeDecodeError:
+        text = content.decode('latin-1')
+    buffer.append(text)
+
+#extract text from PDF bytes
+@traced("extract_text_from_pdf")
+def extract_text_from_pdf(pdf_content: bytes, max_pages: int = 50, max_size_mb: int = 10) -> Optional[str]:
+    return extract_document(pdf_content, "pdf", max_size_mb=max_size_mb, max_pages=max_pages)
@@ -1,14 +1,34 @@
 #load necessary libraries
 import os
 import sys
+import re
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 #prepare environment
 load_dotenv()
 sys.path.insert(0, os.getenv("PYTHONPATH"))
-from page_search import search_google, fetch_page_text
-from src.ai_processing import process_with_ai, generate_search_queries
+from page_search import search_google, fetch_page_text, rank_results
+from rate_limit import get_host_scheduler, get_search_quota
+from session import SearchSession
+from sources import SourceRecord
+from profiling import profile_request, bind
+from src.ai_processing import process_with_ai, process_with_ai_map_reduce, generate_search_queries, generate_search_queries_batched, sanitize_user_input
+
+#pipeline tiers from cheapest to most thorough
+PIPELINE_MODES = ["snippet", "light", "full"]
+
+#search results used as sources by the snippet tier
+SNIPPET_SOURCES = 8
+
+#words that make a query a question rather than plain keywords (cs, sk, en)
+QUESTION_WORDS = {
+    "kde", "kdy", "jak", "co", "proč", "kolik", "který", "která", "které", "jaký", "jaká", "jaké", "kdo",
+    "prečo", "koľko", "ktorý", "aký", "kto",
+    "what", "where", "when", "how", "why", "who", "which", "do", "does", "is", "are", "can"
+}
 
 #main function
 def main():
@@ -23,59 +43,331 @@ def main():
                 print("[!] Selenium container setup failed and local Selenium is not allowed. Process terminated.")
                 return
     
-    query = input("[*] Enter your search query: ").strip()
-    
-    # Basic input validation
-    if not query:
-        print("[!] Empty query. Process terminated.")
-        return
-    
-    if len(query) > 500:
-        print("[!] Query too long (max 500 characters). Process terminated.")
-        return
-
-    #generate search queries using AI (already sanitizes internally)
-    search_queries = generate_search_queries(query)
-    if not search_queries:
-        print("[!] The input query was deemed inappropriate. Process terminated.")
-        return
-    print("[*] Generated search queries:", search_queries)
-
-    #search google
-    urls = search_google(search_queries, disregard_files=True)
-    if not urls:
-        print("[!] No results found. Process terminated.")
-        return
-    
-    #remove duplicate URLs
-    urls = list(dict.fromkeys(urls))
-    print(f"[*] Fetched URLs: {len(urls)}")
-    for url in urls:
-        print(f" - {url}")
+    session = SearchSession()
+    prompt = "[*] Enter your search query: "
+
+    while True:
+        query = input(prompt).strip()
+        
+        # Basic input validation
+        if not query:
+            if session.history:
+                return
+            print("[!] Empty query. Process terminated.")
+            return
+        
+        if len(query) > 500:
+            print("[!] Query too long (max 500 characters). Process terminated.")
+            return
+
+        response = run_search(query, session)
+        if response is None:
+            return
+
+        #display structured response
+        pretty_output(response)
+        print_rate_limit_stats()
 
-    #fetch page contents
+        prompt = "[*] Follow-up question (empty to exit): "
+
+#run the search pipeline for a single query
+#with a session, follow-ups are answered from held sources first and only the delta is searched
+#mode: 'snippet', 'light' or 'full' - the starting tier, escalated while confidence is low
+#with PROFILE_ENABLED, runs slower than PROFILE_THRESHOLD are profiled to PROFILE_DIR
+def run_search(query, session=None, mode=None):
+    with profile_request("run_search", query):
+        return search_pipeline(query, session, mode)
+
+def search_pipeline(query, session=None, mode=None):
     use_selenium = os.getenv("FORCE_SELENIUM", "False").lower() == "true"
     extract_mode = os.getenv("EXTRACT_MODE", "text")
+    mode = (mode or os.getenv("PIPELINE_MODE", "full")).lower()
+    if mode not in PIPELINE_MODES:
+        print(f"[!] Unknown pipeline mode '{mode}', using 'full'")
+        mode = "full"
+    speculation = None
+
+    if session and session.sources:
+        response = answer_from_session(query, session)
+        if response is not None:
+            if not response.is_appropriate:
+                print("[!] The input query was deemed inappropriate. Process terminated.")
+                return None
+            return response
+
+    screen_input = False
+    if os.getenv("KEYWORD_FAST_PATH", "False").lower() == "true" and is_keyword_query(query):
+        #simple keyword query - search it directly instead of waiting for the generator,
+        #the answer request screens it instead
+        search_queries = [domain_query(query)]
+        screen_input = True
+        print("[*] Keyword query detected, skipping query generation:", search_queries)
+    else:
+        #search the raw query while the generator is running
+        if os.getenv("SPECULATIVE_SEARCH", "False").lower() == "true":
+            speculation = start_speculative_search(query, use_selenium, extract_mode, tier=mode)
+
+        #generate search queries using AI (already sanitizes internally)
+        #concurrent callers can share one request through the micro-batcher
+        if os.getenv("QUERY_BATCHING", "False").lower() == "true":
+            generate = generate_search_queries_batched
+        else:
+            generate = generate_search_queries
+        search_queries = generate(session.contextualize(query) if session else query)
+        if not search_queries:
+            if speculation:
+                speculation.abandon()
+            print("[!] The input query was deemed inappropriate. Process terminated.")
+            return None
+        print("[*] Generated search queries:", search_queries)
+
+    #search google - in a session only queries that were not searched yet
+    results = []
+    if session:
+        search_queries = session.new_queries(search_queries)
+        results = list(session.results.values())
+    candidates = int(os.getenv("SEARCH_CANDIDATES", "10"))
+    if search_queries:
+        new_results = search_google(search_queries, max=candidates, disregard_files=True, rich=True)
+        if session:
+            session.add_results(new_results)
+        results = results + new_results
+
+    #merge speculative results as one more ranking
+    if speculation:
+        results = results + speculation.results()
+
+    #keep only the best candidates across all queries
+    top_k = int(os.getenv("FETCH_TOP_K", "4"))
+    ranked = rank_results(results, query, top_k=max(top_k, SNIPPET_SOURCES))
+    fetch_candidates = ranked[:top_k]
+
+    if not ranked:
+        if speculation:
+            speculation.abandon()
+        print("[!] No results found. Process terminated.")
+        return None
+    
+    print(f"[*] Selected {len(fetch_candidates)} of {len(results)} search results:")
+    for result in fetch_candidates:
+        print(f" - {result.url} (score {result.score:.2f})")
+
+    #answer with the cheapest tier first, escalate while confidence is too low
+    escalate_on = os.getenv("ESCALATE_ON_CONFIDENCE", "low").lower().split(",")
+    #only prefetches of pages that made the cut are used, the rest is fetched on demand
+    fetched = speculation.prefetched([result.url for result in fetch_candidates]) if speculation else {}
+    response = None
+    answered = None   #sources behind the last answer - a tier adding nothing is not asked again
+    for tier in PIPELINE_MODES[PIPELINE_MODES.index(mode):]:
+        print(f"[*] Answering with '{tier}' tier...")
+        if tier == "snippet":
+            contents = snippet_sources(ranked[:SNIPPET_SOURCES])
+        elif tier == "full" and mode != "full":
+            #pages read by the light tier are reused, so the full tier also reads the next best results
+            contents = fetch_sources(ranked[:top_k * 2], fetched, session, tier, use_selenium, extract_mode)
+        else:
+            contents = fetch_sources(fetch_candidates, fetched, session, tier, use_selenium, extract_mode)
+
+        sources = [(source.get('url'), source.get('type')) for source in contents]
+        if contents and sources == answered:
+            print(f"[*] '{tier}' tier adds no content, keeping the previous answer")
+            break
+
+        if contents:
+            answered = sources
+            show_previews(contents)
+            response = summarize(contents, query, screen_input)
+            if screen_input and not response.is_appropriate:
+                print(f"[!] Inappropriate input detected: {response.reason}")
+                print("[!] The input query was deemed inappropriate. Process terminated.")
+                return None
+            if response.confidence.lower() not in escalate_on:
+                break
+            print(f"[*] Confidence '{response.confidence}' too low for '{tier}' tier")
+        else:
+            print(f"[!] No content available in '{tier}' tier")
+
+    if response is None:
+        print("[!] No content could be fetched. Process terminated.")
+        return None
+
+    if session:
+        session.remember(query)
+    return response
+
+#search result titles and snippets as sources - answers without fetching any page
+def snippet_sources(results):
+    sources = []
+    for result in results:
+        if not result.snippet:
+            continue
+        sources.append(SourceRecord(result.url, "snippet", result.title, f"{result.title}\n{result.snippet}"))
+    return sources
+
+#fetch page contents - 'light' uses requests only with a tight timeout, 'full' may fall back to Selenium
+#fetched maps URL to source (or None after a failed attempt) and is shared between tiers
+def fetch_sources(results, fetched, session, tier, use_selenium=False, extract_mode="text"):
+    light = tier == "light"
+    timeout = int(os.getenv("LIGHT_FETCH_TIMEOUT", "5")) if light else 10
     contents = []
-    for url in urls:
-        content = fetch_page_text(url, use_selenium, extract_mode)
+    for result in results:
+        url = result.url
+        if session and session.get_source(url):
+            content = session.get_source(url)
+        elif fetched.get(url):
+            content = fetched[url]
+        elif url in fetched and light:
+            #already failed with requests in this tier
+            content = None
+        else:
+            content = fetch_page_text(url, use_selenium and not light, extract_mode, allow_selenium=not light, timeout=timeout)
+            fetched[url] = content
         if content:
             contents.append(content)
+            if session:
+                session.add_source(content)
+    return contents
 
-    #display fetched content previews - TO BE REMOVED
+#display fetched content previews - TO BE REMOVED
+def show_previews(contents):
     for i, source in enumerate(contents, 1):
         print(f"Source {i}:")
         print(f"  URL: {source.get('url', 'N/A')}")
         print(f"  Title: {source.get('title', 'N/A')}")
         print(f"  Type: {source.get('type', 'N/A')}")
         print(f"  Length: {source.get('length', 0)} chars")
-        print(f"  Preview: {source.get('content', '')[:100]}...")
+        print(f"  Preview: {source.excerpt(100)}...")
+
+#process contents with AI
+#screen_input also checks the query's appropriateness (inputs that skipped query generation)
+def summarize(contents, query, screen_input=False):
+    summarize_mode = os.getenv("SUMMARIZE_MODE", "single").lower()
+    if summarize_mode == "map_reduce":
+        max_workers = int(os.getenv("SUMMARIZE_WORKERS", "4"))
+        return process_with_ai_map_reduce(contents, query, max_workers=max_workers, screen_input=screen_input)
+    return process_with_ai(contents, query, screen_input=screen_input)
+
+#try to answer a follow-up from sources the session already holds (one AI call)
+#the follow-up skips the query generator, so the same call also screens its appropriateness
+#returns None when the pipeline should search instead (not confident enough or the call failed)
+def answer_from_session(query, session):
+    sources = session.held_sources()
+    print(f"[*] Trying to answer from {len(sources)} held sources...")
+    try:
+        response = process_with_ai(sources, query, screen_input=True)
+    except Exception as e:
+        print(f"[!] Answering from held sources failed ({type(e).__name__}: {e}), searching instead...")
+        return None
 
-    #process contents with AI
-    response = process_with_ai(contents, query)
+    if not response.is_appropriate:
+        print(f"[!] Inappropriate input detected: {response.reason}")
+        return response
 
-    #display structured response
-    pretty_output(response)
+    accepted = os.getenv("SESSION_ACCEPT_CONFIDENCE", "high,medium").lower().split(",")
+    if response.confidence.lower() in accepted:
+        print(f"[+] Answered from held sources (confidence: {response.confidence})")
+        session.remember(query)
+        return response
+
+    print(f"[*] Held sources are not enough (confidence: {response.confidence}), searching for more...")
+    return None
+
+#check if the query is only a few plain keywords, not a question
+def is_keyword_query(query, max_words=4):
+    words = sanitize_user_input(query).lower().split()
+    if not words or len(words) > max_words:
+        return False
+    if any(not re.fullmatch(r"[\w.\-]+", word) for word in words):
+        return False
+    return not any(word in QUESTION_WORDS for word in words)
+
+#add the target domain to a raw query
+def domain_query(query):
+    query = sanitize_user_input(query)
+    company = os.getenv("TARGET_DOMAIN")
+    if company and company.lower() not in query.lower():
+        query = f"{query} {company}"
+    return query
+
+#speculative search running alongside query generation
+#search results are published as soon as they arrive; prefetches use requests only and are
+#handed over just for the URLs the pipeline decides to fetch, the rest is dropped
+class SpeculativeSearch:
+    def __init__(self, query, extract_mode="text", max_fetches=2, timeout=10):
+        self.query = domain_query(query)
+        self.extract_mode = extract_mode
+        self.max_fetches = max_fetches
+        self.timeout = timeout
+        self._abandoned = threading.Event()
+        self._searched = threading.Event()
+        self._results = []
+        self._fetches = {}
+        self._error = None
+        self._executor = ThreadPoolExecutor(max_workers=1 + max_fetches)
+        self._executor.submit(bind(self._run))
+
+    def _run(self):
+        try:
+            results = search_google([self.query], max=10, disregard_files=True, rich=True)
+            if not self._abandoned.is_set():
+                for result in results[:self.max_fetches]:
+                    if result.url not in self._fetches:
+                        self._fetches[result.url] = self._executor.submit(bind(self._prefetch), result.url)
+            self._results = results
+        except Exception as e:
+            self._error = e
+        finally:
+            self._searched.set()
+            self._executor.shutdown(wait=False)
+
+    #never Selenium - a speculative page must not hold a browser for a result that may not be used
+    def _prefetch(self, url):
+        if self._abandoned.is_set():
+            return None
+        return fetch_page_text(url, False, self.extract_mode, allow_selenium=False, timeout=self.timeout)
+
+    #stop pending prefetches and drop everything
+    def abandon(self):
+        self._abandoned.set()
+        for future in list(self._fetches.values()):
+            future.cancel()
+        print("[*] Speculative search abandoned")
+
+    #search results only - waits for the single search request, never for the prefetches
+    #failures must not break the main pipeline
+    def results(self):
+        self._searched.wait()
+        if self._error is not None:
+            print(f"[!] Speculative search failed: {self._error}")
+            return []
+        return self._results
+
+    #prefetched sources for the URLs that will be fetched; other prefetches are cancelled
+    #a failed prefetch is handed over as None (light tier skips it, full tier retries with Selenium)
+    def prefetched(self, urls):
+        self._searched.wait()
+        wanted = set(urls)
+        handed = {}
+        for url, future in self._fetches.items():
+            if url not in wanted:
+                future.cancel()
+                continue
+            try:
+                handed[url] = future.result()
+            except Exception as e:
+                print(f"[!] Speculative prefetch failed for {url}: {e}")
+        self._abandoned.set()
+        return handed
+
+#tier: the starting pipeline tier - no prefetching for 'snippet' or when every page has to go
+#through Selenium anyway, 'light' prefetches with its tight timeout
+def start_speculative_search(query, use_selenium=False, extract_mode="text", tier="full"):
+    prefetch = tier != "snippet" and not use_selenium
+    max_fetches = int(os.getenv("SPECULATIVE_FETCHES", "2")) if prefetch else 0
+    timeout = 10 if tier == "full" else int(os.getenv("LIGHT_FETCH_TIMEOUT", "5"))
+    speculation = SpeculativeSearch(query, extract_mode, max_fetches, timeout)
+    print(f"[*] Speculative search started: {speculation.query}")
+    return speculation
 
 #function to pretty print AI response
 def pretty_output(response):
@@ -97,6 +389,15 @@ def pretty_output(response):
     print(f"\n[Confidence: {response.confidence}]")
     print("="*60)
 
+#report politeness queueing delay and remaining search quota
+def print_rate_limit_stats():
+    stats = get_host_scheduler().stats()
+    requests_count = sum(host["requests"] for host in stats.values())
+    total_delay = sum(host["total_delay"] for host in stats.values())
+    max_delay = max((host["max_delay"] for host in stats.values()), default=0.0)
+    print(f"[*] Scraping queueing delay: {total_delay:.2f}s total, {max_delay:.2f}s max over {requests_count} requests")
+    print(f"[*] Custom Search quota remaining today: {get_search_quota().remaining()}")
+
 #check and start Selenium container if needed
 def ensure_selenium_container():
     contain_selenium = os.getenv("CONTAIN_SELENIUM")
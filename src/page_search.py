@@ -1,43 +1,132 @@
 import os
+import json
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from dotenv import load_dotenv
 import requests
 from bs4 import BeautifulSoup
 import time
-from typing import Optional, Dict
-import io
-import pdfplumber
+import threading
+import re
+import unicodedata
+from typing import Optional, List
+from collections import OrderedDict
+from urllib.parse import urlparse
+from pydantic import BaseModel
+from extractors import detect_document_type, extract_document, extract_text_from_pdf, supported_extensions
+from rate_limit import get_host_scheduler, get_search_quota
+from content_scoring import select_main_content
+from profiling import traced
+from sources import SourceRecord
 
 load_dotenv()
 
+#recent Custom Search responses, used first and as the only source in cache-only mode
+#shared by concurrent pipelines and speculative searches; entries expire after SEARCH_CACHE_TTL seconds
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+_search_cache = OrderedDict()   #(engine, query) -> (stored at, items)
+_search_cache_lock = threading.Lock()
+
+#cached items of a query, None when missing or expired
+def get_cached_search(cache_key):
+    with _search_cache_lock:
+        entry = _search_cache.get(cache_key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > SEARCH_CACHE_TTL:
+            del _search_cache[cache_key]
+            return None
+        _search_cache.move_to_end(cache_key)
+        return entry[1]
+
+def cache_search(cache_key, items):
+    with _search_cache_lock:
+        _search_cache[cache_key] = (time.monotonic(), items)
+        _search_cache.move_to_end(cache_key)
+        while len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+
+#URL extensions served as regular web pages
+PAGE_EXTENSIONS = ('.html', '.htm', '.php', '.asp', '.aspx', '.jsp', '.shtml')
+
+#single search hit with everything Custom Search returns for it
+class SearchResult(BaseModel):
+    url: str
+    title: str = ""
+    snippet: str = ""
+    rank: int
+    query: str
+    score: float = 0.0
+
 #function to search google using Custom Search API
-def search_google(queries, max=3, disregard_files=False):
+#rich=True returns SearchResult objects instead of plain URLs
+@traced("search_google")
+def search_google(queries, max=3, disregard_files=False, rich=False):
     api_key = os.getenv("GOOGLE_API_KEY")
     search_engine_id = os.getenv("SEARCH_ENGINE_ID")
 
     if not api_key or not search_engine_id:
         raise ValueError("[!] Missing Google API key or Search Engine ID in environment variables.")
 
-    service = build("customsearch", "v1", developerKey=api_key)
+    service = None
     all_urls = []
 
+    #queries come in priority order - when the quota runs low the last ones are dropped
+    quota = get_search_quota()
+    cached = {query: get_cached_search((search_engine_id, query)) for query in queries}
+    uncached = sum(1 for items in cached.values() if items is None)
+    live_allowed = quota.plan(uncached) if uncached else 0
+
     for query in queries:
-        result = service.cse().list(q=query, cx=search_engine_id).execute()
-        items = result.get("items", [])
+        cache_key = (search_engine_id, query)
+        if cached[query] is not None:
+            items = cached[query]
+            print(f"[*] Using cached search results for: {query}")
+        elif live_allowed > 0:
+            if service is None:
+                #CSE_API_ENDPOINT points the client at a stand-in server (load tests)
+                endpoint = os.getenv("CSE_API_ENDPOINT")
+                client_options = {"api_endpoint": endpoint} if endpoint else None
+                service = build("customsearch", "v1", developerKey=api_key, client_options=client_options)
+            try:
+                result = run_search_request(service, query, search_engine_id)
+            except HttpError as e:
+                if is_daily_quota_error(e):
+                    print(f"[!] Custom Search daily quota exceeded: {e}")
+                    quota.exhaust()
+                    live_allowed = 0
+                    continue
+                if is_rate_limit_error(e):
+                    print(f"[!] Custom Search still rate limited, skipping query: {query}")
+                    continue
+                raise
+            quota.consume()
+            live_allowed -= 1
+            items = result.get("items", [])
+            cache_search(cache_key, items)
+        else:
+            print(f"[*] Skipping query (search quota): {query}")
+            continue
         
         urls = []
-        for item in items:
+        for rank, item in enumerate(items, 1):
             url = item["link"]
             
-            if disregard_files:
-                #skip those weird pdfs that pop up from who knows where
-                url_lower = url.lower()
-                if 'file.php' in url_lower or '.pdf' in url_lower or '.doc' in url_lower or '.docx' in url_lower:
-                    print(f"[*] Skipping file URL: {url}")
-                    continue
+            if disregard_files and not is_supported_url(url):
+                print(f"[*] Skipping unsupported file URL: {url}")
+                continue
             
-            urls.append(url)
+            if rich:
+                urls.append(SearchResult(
+                    url=url,
+                    title=item.get("title", ""),
+                    snippet=item.get("snippet", ""),
+                    rank=rank,
+                    query=query
+                ))
+            else:
+                urls.append(url)
             if len(urls) == max:
                 break
         
@@ -45,6 +134,111 @@ def search_google(queries, max=3, disregard_files=False):
 
     return all_urls
 
+#Custom Search error reasons: only the daily ones put the process into cache-only mode
+DAILY_QUOTA_REASONS = {"dailyLimitExceeded", "quotaExceeded"}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "RATE_LIMIT_EXCEEDED"}
+SEARCH_RETRIES = 3
+
+#reasons and message from an HttpError body
+def _error_details(error: HttpError):
+    try:
+        body = json.loads(error.content.decode('utf-8')).get("error", {})
+    except (ValueError, AttributeError, UnicodeDecodeError):
+        return set(), ""
+    items = list(body.get("errors") or []) + list(body.get("details") or [])
+    reasons = {item.get("reason") for item in items if isinstance(item, dict) and item.get("reason")}
+    return reasons, str(body.get("message", ""))
+
+def is_daily_quota_error(error: HttpError) -> bool:
+    reasons, message = _error_details(error)
+    #the newer error format reports the daily limit as a 429 naming the per-day limit
+    return bool(reasons & DAILY_QUOTA_REASONS) or "per day" in message.lower()
+
+def is_rate_limit_error(error: HttpError) -> bool:
+    reasons, _ = _error_details(error)
+    return error.resp.status == 429 or bool(reasons & RATE_LIMIT_REASONS)
+
+#one Custom Search request, backing off on short-term rate limits (1s, 2s, 4s)
+def run_search_request(service, query, search_engine_id, retries=SEARCH_RETRIES, backoff=1.0):
+    for attempt in range(retries + 1):
+        try:
+            return service.cse().list(q=query, cx=search_engine_id).execute()
+        except HttpError as e:
+            if attempt == retries or is_daily_quota_error(e) or not is_rate_limit_error(e):
+                raise
+            delay = backoff * 2 ** attempt
+            print(f"[*] Custom Search rate limited, retrying in {delay:.0f}s...")
+            time.sleep(delay)
+
+#check if a URL points to a page or a file format we can extract
+#extensionless URLs (pages, file.php downloads) are decided later by content type
+def is_supported_url(url: str) -> bool:
+    path = urlparse(url).path.lower()
+    filename = path.rsplit('/', 1)[-1]
+    if '.' not in filename:
+        return True
+    extension = '.' + filename.rsplit('.', 1)[-1]
+    if extension in PAGE_EXTENSIONS:
+        return True
+    return extension in supported_extensions()
+
+#reciprocal rank fusion - merge per-query rankings into one, best first
+def fuse_results(results: List[SearchResult], k: int = 60) -> List[SearchResult]:
+    fused = {}
+    for result in results:
+        entry = fused.get(result.url)
+        if entry is None:
+            entry = result.model_copy(update={"score": 0.0})
+            fused[result.url] = entry
+        elif result.rank < entry.rank:
+            #keep the query where the URL ranked best
+            entry.rank = result.rank
+            entry.query = result.query
+            entry.title = result.title or entry.title
+            entry.snippet = result.snippet or entry.snippet
+        entry.score += 1.0 / (k + result.rank)
+
+    return sorted(fused.values(), key=lambda r: r.score, reverse=True)
+
+#lowercase, strip diacritics and split into words longer than 2 characters
+def tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return [word for word in re.findall(r'\w+', text) if len(word) > 2]
+
+#local relevance of a result's title and snippet to the user question (0..1)
+def score_snippet(result: SearchResult, question: str, prefix_len: int = 5) -> float:
+    question_terms = set(tokenize(question))
+    if not question_terms:
+        return 0.0
+
+    #compare word prefixes so inflected forms still match (hodiny/hodin, office/offices)
+    title_stems = {word[:prefix_len] for word in tokenize(result.title)}
+    snippet_stems = {word[:prefix_len] for word in tokenize(result.snippet)}
+
+    score = 0.0
+    for term in question_terms:
+        stem = term[:prefix_len]
+        if stem in title_stems:
+            score += 1.0
+        elif stem in snippet_stems:
+            score += 0.6
+
+    return score / len(question_terms)
+
+#fuse rankings, rescore with snippets and keep the best top_k candidates
+def rank_results(results: List[SearchResult], question: str, top_k: int = 4, snippet_weight: float = 1.0) -> List[SearchResult]:
+    fused = fuse_results(results)
+    if not fused:
+        return []
+
+    best_fused = fused[0].score
+    for result in fused:
+        result.score = result.score / best_fused + snippet_weight * score_snippet(result, question)
+
+    fused.sort(key=lambda r: r.score, reverse=True)
+    return fused[:top_k]
+
 def is_pdf_content(response: requests.Response) -> bool:
     content_type = response.headers.get('Content-Type', '').lower()
     
@@ -56,43 +250,17 @@ def is_pdf_content(response: requests.Response) -> bool:
     
     return False
 
-def extract_text_from_pdf(pdf_content: bytes, max_pages: int = 50, max_size_mb: int = 10) -> Optional[str]:
-    try:
-        # Check file size limit
-        size_mb = len(pdf_content) / (1024 * 1024)
-        if size_mb > max_size_mb:
-            print(f"[!] PDF too large: {size_mb:.1f}MB (max {max_size_mb}MB)")
-            return None
-        
-        text_parts = []
-        
-        with pdfplumber.open(io.BytesIO(pdf_content)) as pdf:
-            page_count = len(pdf.pages)
-            if page_count > max_pages:
-                print(f"[*] PDF has {page_count} pages, limiting to first {max_pages}")
-            
-            for i, page in enumerate(pdf.pages):
-                if i >= max_pages:
-                    break
-                page_text = page.extract_text()
-                if page_text:
-                    text_parts.append(page_text)
-        
-        full_text = '\n'.join(text_parts)
-        full_text = ' '.join(full_text.split())
-        
-        return full_text
-    
-    except Exception as e:
-        print(f"[!] Error while extracting text from PDF: {e}")
-        return None
+#document type returned for downloads that were read but cannot be extracted
+REJECTED_CONTENT = "rejected"
 
 #1st attempt: fetch page using requests
-def fetch_with_requests(url: str, timeout: int = 10, max_size_mb: int = 10) -> Optional[tuple[str, bool]]:
+#returns (text, document type) - document type is None for HTML, REJECTED_CONTENT for unsupported binaries
+@traced("fetch_with_requests")
+def fetch_with_requests(url: str, timeout: int = 10, max_size_mb: int = 10) -> Optional[tuple[str, Optional[str]]]:
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,application/pdf,image/webp,*/*;q=0.8',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,application/pdf,application/vnd.openxmlformats-officedocument.*,application/vnd.oasis.opendocument.text,image/webp,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.9,cs;q=0.8',
             'Accept-Encoding': 'gzip, deflate, br',
             'DNT': '1',
@@ -100,6 +268,9 @@ def fetch_with_requests(url: str, timeout: int = 10, max_size_mb: int = 10) -> O
             'Upgrade-Insecure-Requests': '1'
         }
 
+        #respect per-host request rate
+        get_host_scheduler().acquire(url)
+
         response = requests.get(url, headers=headers, timeout=timeout, stream=True)
         
         # Check content size before downloading
@@ -108,24 +279,31 @@ def fetch_with_requests(url: str, timeout: int = 10, max_size_mb: int = 10) -> O
             size_mb = int(content_length) / (1024 * 1024)
             if size_mb > max_size_mb:
                 print(f"[!] Content too large: {size_mb:.1f}MB (max {max_size_mb}MB)")
-                return (None, False)
+                return (None, None)
         
         response.raise_for_status()
         
         # Download content with size limit
-        content = b''
+        buffer = bytearray()
         max_bytes = max_size_mb * 1024 * 1024
         for chunk in response.iter_content(chunk_size=8192):
-            content += chunk
-            if len(content) > max_bytes:
+            buffer += chunk
+            if len(buffer) > max_bytes:
                 print(f"[!] Content exceeded {max_size_mb}MB, truncating")
                 break
+        content = bytes(buffer)
         
-        #check if PDF
-        if content[:4] == b'%PDF' or response.headers.get('Content-Type', '').lower().startswith('application/pdf'):
-            print(f"[*] PDF detected: {url}")
-            text = extract_text_from_pdf(content)
-            return (text, True)
+        #check if a document (PDF, DOCX, XLSX, ...)
+        doc_type = detect_document_type(content, response.headers.get('Content-Type', ''))
+        if doc_type:
+            print(f"[*] {doc_type.upper()} detected: {url}")
+            text = extract_document(content, doc_type, max_size_mb=max_size_mb)
+            return (text, doc_type)
+
+        #anything else must be a page - unknown binary downloads (.doc, .zip, images) are rejected
+        if not is_html_response(content, response.headers.get('Content-Type', '')):
+            print(f"[!] Unsupported binary content ({response.headers.get('Content-Type', 'no content type')}): {url}")
+            return (None, REJECTED_CONTENT)
 
         #HTML content
         try:
@@ -135,56 +313,208 @@ def fetch_with_requests(url: str, timeout: int = 10, max_size_mb: int = 10) -> O
                 text = content.decode('latin-1')
             except:
                 print(f"[!] Failed to decode content from {url}")
-                return (None, False)
+                return (None, None)
         
-        return (text, False)
+        return (text, None)
         
     except requests.RequestException as e:
         print(f"[!] Requests failed for {url}: {e}")
-        return (None, False)
+        return (None, None)
+
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+#responses parsed as pages: HTML and other text types, or no type at all
+#NUL bytes mean binary whatever the header says
+def is_html_response(content: bytes, content_type: str) -> bool:
+    if b'\x00' in content[:8192]:
+        return False
+    content_type = content_type.split(';', 1)[0].strip().lower()
+    return not content_type or content_type in HTML_CONTENT_TYPES or content_type.startswith('text/')
+
+#resource URL patterns blocked by the Selenium render profiles (DevTools Network.setBlockedURLs)
+BLOCKED_MEDIA = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.ogg", "*.mp3", "*.wav", "*.avi", "*.mov", "*.m3u8"
+]
+BLOCKED_TRACKERS = [
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*googleadservices.com*", "*facebook.net*", "*connect.facebook.com*", "*hotjar.com*", "*clarity.ms*",
+    "*smartlook.com*", "*gemius.pl*", "*criteo.com*", "*cookiebot.com*", "*youtube.com/embed*", "*ssp.seznam.cz*"
+]
+BLOCKED_STYLES = ["*.css"]
+
+#full = everything, light = no images/fonts/media/trackers, minimal = light without CSS
+RENDER_PROFILES = {
+    "full": [],
+    "light": BLOCKED_MEDIA + BLOCKED_TRACKERS,
+    "minimal": BLOCKED_MEDIA + BLOCKED_TRACKERS + BLOCKED_STYLES
+}
+
+#create Chrome driver (local or remote) with the given render profile
+def create_selenium_driver(profile: str = "light"):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument('--headless=new')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36')
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+
+    if profile != "full":
+        #images are also blocked by preference - works even where DevTools is unavailable
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        chrome_options.add_argument('--mute-audio')
+        chrome_options.add_argument('--autoplay-policy=user-gesture-required')
+        chrome_options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+            "profile.default_content_setting_values.geolocation": 2
+        })
+
+    # Check if using remote Selenium 
+    remote_url = os.getenv("SELENIUM_REMOTE_URL")
+    if remote_url:
+        print(f"[*] Using remote Selenium at {remote_url}")
+        driver = webdriver.Remote(command_executor=remote_url, options=chrome_options)
+    else:
+        # Local ChromeDriver 
+        driver = webdriver.Chrome(options=chrome_options)
+
+    blocked = RENDER_PROFILES.get(profile, RENDER_PROFILES["light"])
+    if blocked:
+        try:
+            execute_devtools_command(driver, "Network.enable", {})
+            execute_devtools_command(driver, "Network.setBlockedURLs", {"urls": blocked})
+        except Exception as e:
+            #preferences still block images, but fonts, media and trackers will load
+            print(f"[!] Request blocking unavailable ({type(e).__name__}: {e}), using preferences only")
+
+    return driver
+
+#run a DevTools command on a local ChromeDriver or through a Selenium Grid's CDP endpoint
+def execute_devtools_command(driver, cmd: str, params: dict):
+    if hasattr(driver, "execute_cdp_cmd"):
+        return driver.execute_cdp_cmd(cmd, params)
+    #webdriver.Remote has no execute_cdp_cmd, but Grid forwards goog/cdp/execute to Chrome
+    driver.command_executor.add_command("executeCdpCommand", "POST", "/session/$sessionId/goog/cdp/execute")
+    return driver.execute("executeCdpCommand", {"cmd": cmd, "params": params})["value"]
+
+#page is ready when loaded and both DOM mutations and network requests have been quiet for a while
+READY_STATE_SCRIPT = """
+if (!window.__aiSearchObserver) {
+    window.__aiSearchLastMutation = performance.now();
+    window.__aiSearchObserver = new MutationObserver(function() {
+        window.__aiSearchLastMutation = performance.now();
+    });
+    window.__aiSearchObserver.observe(document, {childList: true, subtree: true, characterData: true});
+}
+var lastResource = 0;
+performance.getEntriesByType('resource').forEach(function(entry) {
+    lastResource = Math.max(lastResource, entry.responseEnd || entry.startTime);
+});
+var now = performance.now();
+return [document.readyState, now - window.__aiSearchLastMutation, now - lastResource];
+"""
+
+#adaptive replacement for a fixed sleep - returns seconds spent waiting
+def wait_for_page_ready(driver, max_wait: float = 2.0, quiet_period: float = 0.5, poll_interval: float = 0.1) -> float:
+    start = time.monotonic()
+    quiet_ms = quiet_period * 1000
+    while True:
+        elapsed = time.monotonic() - start
+        try:
+            ready_state, since_mutation, since_resource = driver.execute_script(READY_STATE_SCRIPT)
+        except Exception:
+            #page navigated or script blocked - treat as settled
+            return elapsed
+        if ready_state == "complete" and since_mutation >= quiet_ms and since_resource >= quiet_ms:
+            return elapsed
+        if elapsed >= max_wait:
+            print(f"[*] Page still changing after {max_wait}s, continuing")
+            return elapsed
+        time.sleep(poll_interval)
+
+#in-browser version of extract_text_from_html + clean_html, returns [content, title]
+#so only the extracted text crosses the WebDriver wire instead of page_source
+IN_BROWSER_EXTRACT_SCRIPT = """
+var mode = arguments[0];
+var title = (document.querySelector('title') || {}).textContent
+    || (document.querySelector('h1') || {}).textContent || '';
+
+var removed = ['script', 'style', 'nav', 'footer', 'header', 'aside', 'iframe', 'noscript'];
+document.querySelectorAll(removed.join(',')).forEach(function(el) { el.remove(); });
+
+var main = document.querySelector('main') || document.querySelector('article') || document.body || document.documentElement;
+var squash = function(text) { return text.split(/\\s+/).filter(Boolean).join(' '); };
+
+if (mode !== 'html') {
+    var parts = [];
+    var walker = document.createTreeWalker(main, NodeFilter.SHOW_TEXT);
+    while (walker.nextNode()) {
+        var text = walker.currentNode.nodeValue.trim();
+        if (text) parts.push(text);
+    }
+    return [squash(parts.join(' ')), title.trim()];
+}
+
+var allowed = {h1:1, h2:1, h3:1, h4:1, h5:1, h6:1, p:1, ul:1, ol:1, li:1, table:1, tr:1, td:1, th:1,
+               thead:1, tbody:1, a:1, strong:1, em:1, b:1, i:1, br:1, div:1, span:1, section:1};
+var escape = function(text) {
+    return text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+};
+var serialize = function(node) {
+    if (node.nodeType === Node.TEXT_NODE) return escape(node.nodeValue);
+    if (node.nodeType !== Node.ELEMENT_NODE) return '';
+    var inner = '';
+    node.childNodes.forEach(function(child) { inner += serialize(child); });
+    var tag = node.tagName.toLowerCase();
+    if (!allowed[tag]) return inner;
+    if (tag === 'br') return '<br/>';
+    var href = tag === 'a' ? node.getAttribute('href') : null;
+    var open = href ? '<a href="' + escape(href).replace(/"/g, '&quot;') + '">' : '<' + tag + '>';
+    return open + inner + '</' + tag + '>';
+};
+return [squash(serialize(main)), title.trim()];
+"""
 
 #2nd attempt: fallback to fetch page using Selenium
-def fetch_with_selenium(url: str, timeout: int = 15) -> Optional[str]:
+#with extract_mode set, extraction runs in the browser and (content, title) is returned instead of HTML
+@traced("fetch_with_selenium")
+def fetch_with_selenium(url: str, timeout: int = 15, extract_mode: str = None):
     try:
-        from selenium import webdriver
-        from selenium.webdriver.chrome.options import Options
         from selenium.webdriver.common.by import By
         from selenium.webdriver.support.ui import WebDriverWait
         from selenium.webdriver.support import expected_conditions as EC
         
         print(f"[*] Trying Selenium for {url} (this may take a moment)...")
         
-        chrome_options = Options()
-        chrome_options.add_argument('--headless=new')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36')
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option('useAutomationExtension', False)
-        
-        # Check if using remote Selenium 
-        remote_url = os.getenv("SELENIUM_REMOTE_URL")
-        if remote_url:
-            print(f"[*] Using remote Selenium at {remote_url}")
-            driver = webdriver.Remote(command_executor=remote_url, options=chrome_options)
-        else:
-            # Local ChromeDriver 
-            driver = webdriver.Chrome(options=chrome_options)
-        
+        profile = os.getenv("SELENIUM_RENDER_PROFILE", "light").lower()
+        driver = create_selenium_driver(profile)
         driver.set_page_load_timeout(timeout)
         
         try:
+            get_host_scheduler().acquire(url)
             driver.get(url)
 
             WebDriverWait(driver, 10).until(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
             
-            #javascript execution delay
-            time.sleep(2)
+            #wait for javascript rendering to settle - never longer than the old fixed 2s sleep
+            max_wait = min(float(os.getenv("SELENIUM_MAX_SETTLE", "2")), 2.0)
+            waited = wait_for_page_ready(driver, max_wait=max_wait)
             
+            if extract_mode:
+                content, title = driver.execute_script(IN_BROWSER_EXTRACT_SCRIPT, extract_mode)
+                print(f"[+] Selenium successfully extracted {url} in browser (settled after {waited:.1f}s, profile: {profile})")
+                return content, title or "Untitled"
+
             html = driver.page_source
-            print(f"[+] Selenium successfully fetched {url}")
+            print(f"[+] Selenium successfully fetched {url} (settled after {waited:.1f}s, profile: {profile})")
             
             return html
         finally:
@@ -211,7 +541,7 @@ def extract_title(soup: BeautifulSoup = None, text: str = None) -> str:
         if h1_tag:
             return h1_tag.get_text().strip()
     
-    #for PDF or if no title found, try to extract from first line
+    #for documents or if no title found, try to extract from first line
     if text:
         first_line = text.split('\n')[0].strip() if '\n' in text else text[:100].strip()
         return first_line if len(first_line) < 150 else first_line[:150] + "..."
@@ -219,7 +549,11 @@ def extract_title(soup: BeautifulSoup = None, text: str = None) -> str:
     return "Untitled"
 
 #get text content from HTML
-def extract_text_from_html(html: str, mode: str = 'text', max_size_mb: int = 5) -> tuple[str, str]:
+#selector: 'density' scores blocks by text/link density and drops repeated site blocks (url needed),
+#'simple' takes main/article/body as is
+@traced("extract_text_from_html")
+def extract_text_from_html(html: str, mode: str = 'text', max_size_mb: int = 5, url: str = None, selector: str = None) -> tuple[str, str]:
+    selector = selector or os.getenv("CONTENT_SELECTOR", "density")
     try:
         # Check HTML size limit
         size_mb = len(html.encode('utf-8')) / (1024 * 1024)
@@ -237,7 +571,10 @@ def extract_text_from_html(html: str, mode: str = 'text', max_size_mb: int = 5)
         print(f"[!] Error parsing HTML: {e}")
         return ("", "Error")
     
-    main_content = soup.find('main') or soup.find('article') or soup.find('body')
+    if selector == 'simple':
+        main_content = soup.find('main') or soup.find('article') or soup.find('body')
+    else:
+        main_content = select_main_content(soup, url)
     if not main_content:
         main_content = soup
     
@@ -281,45 +618,59 @@ def clean_html(element) -> str:
     return html_str.strip()
 
 #main function to fetch page text with fallback
-def fetch_page_text(url: str, use_selenium: bool = False, extract_mode: str = 'text') -> Optional[Dict]:
+#in_browser runs the Selenium extraction inside the browser (default from SELENIUM_IN_BROWSER_EXTRACT,
+#only with CONTENT_SELECTOR=simple)
+#allow_selenium=False with a short timeout gives a cheap requests-only fetch
+@traced("fetch_page_text")
+def fetch_page_text(url: str, use_selenium: bool = False, extract_mode: str = 'text', in_browser: bool = None,
+                    allow_selenium: bool = True, timeout: int = 10) -> Optional[SourceRecord]:
     result = None
-    is_pdf = False
+    doc_type = None
     
     if not use_selenium:
         print(f"[1/2] Trying requests for {url}...")
-        result, is_pdf = fetch_with_requests(url)
+        result, doc_type = fetch_with_requests(url, timeout=timeout)
+
+    #a browser would only download the same file again
+    if doc_type == REJECTED_CONTENT:
+        print(f"[-] Skipping {url}, content cannot be extracted")
+        return None
     
-    if (result is None or result == "") and not is_pdf:
+    if (result is None or result == "") and not doc_type and not allow_selenium:
+        print(f"[-] Requests failed for {url}, Selenium not allowed")
+        return None
+
+    if (result is None or result == "") and not doc_type:
         print(f"[2/2] Falling back to Selenium for {url}...")
-        html = fetch_with_selenium(url)
-        if html:
-            result = html
+        if in_browser is None:
+            in_browser = os.getenv("SELENIUM_IN_BROWSER_EXTRACT", "False").lower() == "true"
+        #the in-browser script only knows main/article/body - density selection needs the page source
+        if in_browser and os.getenv("CONTENT_SELECTOR", "density") != "simple":
+            print("[*] In-browser extraction needs CONTENT_SELECTOR=simple, extracting from page source")
+            in_browser = False
+        if in_browser:
+            extracted = fetch_with_selenium(url, extract_mode=extract_mode)
+            if extracted and extracted[0]:
+                content, title = extracted
+                content_type = "html_structured" if extract_mode == 'html' else "html"
+                print(f"[+] Successfully extracted {len(content)} characters from {url} (mode: {extract_mode}, in browser)")
+                return SourceRecord(url, content_type, title, content)
+        else:
+            html = fetch_with_selenium(url)
+            if html:
+                result = html
     
     if result:
-        if is_pdf:
-            print(f"[+] Successfully extracted {len(result)} characters from PDF: {url}")
+        if doc_type:
+            print(f"[+] Successfully extracted {len(result)} characters from {doc_type.upper()}: {url}")
             title = extract_title(text=result)
-            return {
-                "url": url,
-                "type": "pdf",
-                "title": title,
-                "content": result,
-                "length": len(result),
-                "timestamp": time.time()
-            }
+            return SourceRecord(url, doc_type, title, result)
         else:
             try:
-                content, title = extract_text_from_html(result, mode=extract_mode)
+                content, title = extract_text_from_html(result, mode=extract_mode, url=url)
                 content_type = "html_structured" if extract_mode == 'html' else "html"
                 print(f"[+] Successfully extracted {len(content)} characters from {url} (mode: {extract_mode})")
-                return {
-                    "url": url,
-                    "type": content_type,
-                    "title": title,
-                    "content": content,
-                    "length": len(content),
-                    "timestamp": time.time()
-                }
+                return SourceRecord(url, content_type, title, content)
             except Exception as e:
                 print(f"[!] Failed to parse HTML from {url}: {e}")
                 return None
@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import time
+import itertools
+import threading
+import functools
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+#opt-in request profiling: every traced request records stage spans and sampled stacks,
+#only requests slower than the threshold are written to disk
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "False").lower() == "true"
+PROFILE_THRESHOLD = float(os.getenv("PROFILE_THRESHOLD", "10"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.05"))
+#stacks of a request are only sampled once it has run this long - fast requests are never sampled
+PROFILE_SAMPLE_DELAY = float(os.getenv("PROFILE_SAMPLE_DELAY", str(PROFILE_THRESHOLD / 2)))
+MAX_STACK_DEPTH = 128
+
+_local = threading.local()
+_active = {}   #thread id -> trace of the request that thread is working for
+_active_lock = threading.Lock()
+_sampler = None
+_file_counter = itertools.count(1)
+_labels = {}   #code object -> frame label, only touched by the sampler thread
+
+#spans and stack samples of one request, shared by every thread working for it
+class RequestTrace:
+    def __init__(self, name: str, label: str = None):
+        self.name = name
+        self.label = label
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.finished = None
+        self.spans = []
+        self.samples = Counter()
+        self.lock = threading.Lock()
+
+    def add_span(self, name, start, end, depth, error=None):
+        with self.lock:
+            self.spans.append({
+                "name": name,
+                "thread": threading.current_thread().name,
+                "start_ms": (start - self.started) * 1000,
+                "duration_ms": (end - start) * 1000,
+                "depth": depth,
+                "error": error
+            })
+
+    def add_sample(self, stack):
+        with self.lock:
+            self.samples[stack] += 1
+
+    @property
+    def duration(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    #count, total and max time per stage
+    def stages(self) -> dict:
+        stages = {}
+        with self.lock:
+            for item in self.spans:
+                stage = stages.setdefault(item["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0})
+                stage["count"] += 1
+                stage["total_ms"] += item["duration_ms"]
+                stage["max_ms"] = max(stage["max_ms"], item["duration_ms"])
+                stage["errors"] += 1 if item["error"] else 0
+        return stages
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+#timed stage of the current request - a no-op when the thread is not traced
+class Span:
+    def __init__(self, name: str):
+        self.name = name
+        self.trace = None
+
+    def __enter__(self):
+        self.trace = current_trace()
+        if self.trace is not None:
+            self.depth = _local.depth
+            _local.depth += 1
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is not None:
+            _local.depth = self.depth
+            self.trace.add_span(self.name, self.start, time.perf_counter(), self.depth, exc_type.__name__ if exc_type else None)
+        return False
+
+def span(name: str) -> Span:
+    return Span(name)
+
+#decorator form of span - untraced calls only pay for one thread-local lookup
+def traced(name: str):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_trace() is None:
+                return func(*args, **kwargs)
+            with Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+#run the calling thread (or a worker) on behalf of a trace
+@contextmanager
+def attach(trace: RequestTrace):
+    if trace is None:
+        yield
+        return
+    previous = current_trace(), getattr(_local, "depth", 0)
+    thread_id = threading.get_ident()
+    _local.trace, _local.depth = trace, 0
+    with _active_lock:
+        _active[thread_id] = trace
+    try:
+        yield
+    finally:
+        _local.trace, _local.depth = previous
+        with _active_lock:
+            if previous[0] is None:
+                _active.pop(thread_id, None)
+            else:
+                _active[thread_id] = previous[0]
+
+#carry the caller's trace into a thread pool task
+def bind(func):
+    trace = current_trace()
+    if trace is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with attach(trace):
+            return func(*args, **kwargs)
+    return wrapper
+
+#trace one pipeline request; slow ones are written to PROFILE_DIR
+#nested calls on an already traced thread join the outer request
+@contextmanager
+def profile_request(name: str, label: str = None):
+    if not PROFILE_ENABLED or current_trace() is not None:
+        yield None
+        return
+
+    _ensure_sampler()
+    trace = RequestTrace(name, label)
+    try:
+        with attach(trace):
+            yield trace
+    finally:
+        trace.finished = time.perf_counter()
+        if trace.duration >= PROFILE_THRESHOLD:
+            write_profile(trace)
+
+#stack as root-first "function (file:line)" frames joined by semicolons (folded format)
+def fold_stack(frame) -> str:
+    frames = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        label = _labels.get(code)
+        if label is None:
+            label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        frames.append(label)
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+#samples only threads currently working for a traced request that has run past PROFILE_SAMPLE_DELAY
+def _sample_loop():
+    while True:
+        time.sleep(PROFILE_SAMPLE_INTERVAL)
+        now = time.perf_counter()
+        with _active_lock:
+            active = [(thread_id, trace) for thread_id, trace in _active.items() if now - trace.started >= PROFILE_SAMPLE_DELAY]
+        if not active:
+            continue
+        frames = sys._current_frames()
+        for thread_id, trace in active:
+            frame = frames.get(thread_id)
+            if frame is not None:
+                trace.add_sample(fold_stack(frame))
+
+def _ensure_sampler():
+    global _sampler
+    with _active_lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="profile-sampler", daemon=True)
+            _sampler.start()
+
+#<stamp>_<n>.folded for flamegraph.pl / speedscope and <stamp>_<n>.spans.json with the stage breakdown
+def write_profile(trace: RequestTrace, directory: str = None) -> str:
+    directory = directory or PROFILE_DIR
+    base = os.path.join(
+        directory,
+        f"{datetime.fromtimestamp(trace.wall_started).strftime('%Y%m%d-%H%M%S')}_{next(_file_counter):04d}"
+    )
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with trace.lock:
+            samples = dict(trace.samples)
+            spans = sorted(trace.spans, key=lambda item: item["start_ms"])
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            for stack, count in sorted(samples.items()):
+                f.write(f"{stack} {count}\n")
+        with open(base + ".spans.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "name": trace.name,
+                "label": trace.label,
+                "started": datetime.fromtimestamp(trace.wall_started).isoformat(),
+                "duration_ms": trace.duration * 1000,
+                "threshold_ms": PROFILE_THRESHOLD * 1000,
+                "sample_interval_ms": PROFILE_SAMPLE_INTERVAL * 1000,
+                "sample_delay_ms": PROFILE_SAMPLE_DELAY * 1000,
+                "samples": sum(samples.values()),
+                "stages": trace.stages(),
+                "spans": spans
+            }, f, indent=4, ensure_ascii=False)
+    except OSError as e:
+        print(f"[!] Failed to write profile: {e}")
+        return None
+
+    print(f"[*] Slow request ({trace.duration:.1f}s) profiled: {base}.spans.json")
+    return base
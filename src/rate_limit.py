@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+#token bucket - acquire() reserves a token and sleeps until it is due
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    #returns how long the caller had to wait
+    def acquire(self, tokens: float = 1) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            #going below zero reserves a future slot, so waiting callers keep their order
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+#per-host politeness for scraping, shared by every thread in the process
+class HostScheduler:
+    def __init__(self, rate: float = 1.0, burst: float = 2):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.delays = {}   #host -> running request count, total and max wait
+        self.lock = threading.Lock()
+
+    def _bucket(self, host):
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self.buckets[host] = bucket
+                self.delays[host] = {"requests": 0, "total_delay": 0.0, "max_delay": 0.0}
+            return bucket
+
+    #wait for a request slot on the URL's host
+    def acquire(self, url: str) -> float:
+        host = urlparse(url).netloc.lower()
+        waited = self._bucket(host).acquire()
+        with self.lock:
+            delays = self.delays[host]
+            delays["requests"] += 1
+            delays["total_delay"] += waited
+            delays["max_delay"] = max(delays["max_delay"], waited)
+        if waited > 0.1:
+            print(f"[*] Waited {waited:.2f}s for a request slot on {host}")
+        return waited
+
+    #queueing delay per host: requests, total, average and max wait in seconds
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                host: {
+                    **delays,
+                    "avg_delay": delays["total_delay"] / delays["requests"] if delays["requests"] else 0.0
+                }
+                for host, delays in self.delays.items()
+            }
+
+#Custom Search daily quota, persisted so it survives restarts
+class SearchQuota:
+    def __init__(self, daily_limit: int = 100, path: str = ".cse_quota.json", low_watermark: float = 0.2):
+        self.daily_limit = daily_limit
+        self.path = path
+        self.low_watermark = low_watermark
+        self.lock = threading.Lock()
+        self.day, self.used = self._load()
+
+    #the quota resets at midnight Pacific Time (DST ignored)
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone(timedelta(hours=-8))).strftime("%Y-%m-%d")
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("date") == self._today():
+                return data["date"], int(data.get("used", 0))
+        except (OSError, ValueError, KeyError):
+            pass
+        return self._today(), 0
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"date": self.day, "used": self.used}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[!] Failed to save search quota: {e}")
+
+    def _roll_day(self):
+        today = self._today()
+        if today != self.day:
+            self.day, self.used = today, 0
+
+    def remaining(self) -> int:
+        with self.lock:
+            self._roll_day()
+            return max(0, self.daily_limit - self.used)
+
+    def consume(self, count: int = 1):
+        with self.lock:
+            self._roll_day()
+            self.used += count
+            self._save()
+
+    #the API reported the quota as exceeded - trust it over our own count
+    def exhaust(self):
+        with self.lock:
+            self._roll_day()
+            self.used = max(self.used, self.daily_limit)
+            self._save()
+
+    #how many of the requested live queries may run; 0 means cache-only mode
+    def plan(self, requested: int) -> int:
+        remaining = self.remaining()
+        if remaining == 0:
+            print("[!] Custom Search quota exhausted, serving cached results only")
+            return 0
+        if remaining <= self.daily_limit * self.low_watermark:
+            allowed = min(remaining, max(1, requested // 2))
+            if allowed < requested:
+                print(f"[!] Custom Search quota low ({remaining} left), running {allowed} of {requested} queries")
+            return allowed
+        return min(requested, remaining)
+
+_host_scheduler = None
+_search_quota = None
+_lock = threading.Lock()
+
+#process-wide scheduler configured from environment
+def get_host_scheduler() -> HostScheduler:
+    global _host_scheduler
+    with _lock:
+        if _host_scheduler is None:
+            _host_scheduler = HostScheduler(
+                rate=float(os.getenv("SCRAPE_RATE_PER_HOST", "1.0")),
+                burst=float(os.getenv("SCRAPE_BURST", "2"))
+            )
+        return _host_scheduler
+
+#process-wide quota tracker configured from environment
+def get_search_quota() -> SearchQuota:
+    global _search_quota
+    with _lock:
+        if _search_quota is None:
+            _search_quota = SearchQuota(
+                daily_limit=int(os.getenv("CSE_DAILY_QUOTA", "100")),
+                path=os.getenv("CSE_QUOTA_FILE", ".cse_quota.json"),
+                low_watermark=float(os.getenv("CSE_LOW_WATERMARK", "0.2"))
+            )
+        return _search_quota
@@ -0,0 +1,74 @@
+import os
+from collections import OrderedDict
+from typing import List, Optional
+from dotenv import load_dotenv
+from sources import SourceRecord
+
+load_dotenv()
+
+#conversation state kept between questions so follow-ups reuse what was already fetched
+class SearchSession:
+    def __init__(self, max_sources: int = None, max_chars: int = None, max_results: int = 200, max_history: int = 5):
+        self.max_sources = max_sources or int(os.getenv("SESSION_MAX_SOURCES", "20"))
+        self.max_chars = max_chars or int(os.getenv("SESSION_MAX_CHARS", "300000"))
+        self.max_results = max_results
+        self.max_history = max_history
+
+        self.history: List[str] = []
+        self.queries = OrderedDict()   #generated queries already searched
+        self.results = OrderedDict()   #url -> SearchResult
+        self.sources = OrderedDict()   #url -> SourceRecord, least recently used first
+        self.total_chars = 0
+
+    #remember an answered question
+    def remember(self, question: str):
+        self.history.append(question)
+        del self.history[:-self.max_history]
+
+    #generator input for a follow-up: the previous question gives it context
+    def contextualize(self, question: str, max_length: int = 500) -> str:
+        if not self.history:
+            return question
+        previous = self.history[-1]
+        context = f"Previous question: {previous}\nFollow-up question: {question}"
+        if len(context) > max_length:
+            return question
+        return context
+
+    #drop queries that were already searched in this session
+    def new_queries(self, queries: List[str]) -> List[str]:
+        fresh = [query for query in queries if query.lower() not in self.queries]
+        for query in fresh:
+            self.queries[query.lower()] = True
+        while len(self.queries) > self.max_results:
+            self.queries.popitem(last=False)
+        return fresh
+
+    def add_results(self, results):
+        for result in results:
+            self.results[result.url] = result
+            self.results.move_to_end(result.url)
+        while len(self.results) > self.max_results:
+            self.results.popitem(last=False)
+
+    def get_source(self, url: str) -> Optional[SourceRecord]:
+        source = self.sources.get(url)
+        if source is not None:
+            self.sources.move_to_end(url)
+        return source
+
+    #keep a fetched source, evicting the least recently used ones over the limits
+    #records share their content with the process-wide store, so holding one costs no extra copy
+    def add_source(self, source: SourceRecord):
+        url = source.url
+        if url in self.sources:
+            self.total_chars -= self.sources.pop(url).length
+        self.sources[url] = source
+        self.total_chars += source.length
+
+        while len(self.sources) > 1 and (len(self.sources) > self.max_sources or self.total_chars > self.max_chars):
+            _, evicted = self.sources.popitem(last=False)
+            self.total_chars -= evicted.length
+
+    def held_sources(self) -> List[SourceRecord]:
+        return list(self.sources.values())
@@ -0,0 +1,164 @@
+import os
+import re
+import time
+import zlib
+import hashlib
+import threading
+import weakref
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+#clean scraped content
+def sanitize_scraped_content(text: str) -> str:
+    if not text:
+        return ""
+
+    # Remove control characters
+    text = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f-\x9f]', '', text)
+
+    # Remove excessive whitespace but preserve structure
+    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)  # Max 2 consecutive newlines
+    text = re.sub(r' +', ' ', text)  # Multiple spaces to single space
+
+    # Remove common noise patterns
+    text = re.sub(r'(cookies?|gdpr|privacy policy)\s+(accept|consent|agree)', '', text, flags=re.IGNORECASE)
+
+    return text.strip()
+
+#one stored content body, shared by every record with the same content
+class ContentBlob:
+    __slots__ = ("key", "data", "compressed", "__weakref__")
+
+    def __init__(self, key: bytes, data, compressed: bool):
+        self.key = key
+        self.data = data
+        self.compressed = compressed
+
+    def text(self) -> str:
+        if self.compressed:
+            return zlib.decompress(self.data).decode('utf-8')
+        return self.data
+
+    #first characters without decompressing the whole body
+    def prefix(self, limit: int) -> str:
+        if not self.compressed:
+            return self.data[:limit]
+        #a character is at most 4 bytes in UTF-8; a cut multi-byte character is dropped
+        head = zlib.decompressobj().decompress(self.data, limit * 4)
+        return head.decode('utf-8', errors='ignore')[:limit]
+
+    def stored_bytes(self) -> int:
+        return len(self.data) if self.compressed else len(self.data.encode('utf-8'))
+
+#content-addressed store - identical content fetched by concurrent requests, sessions and
+#speculative prefetches is kept once, and dropped when the last record using it goes away
+class ContentStore:
+    def __init__(self, compress: bool = False, compress_min_chars: int = 4096):
+        self.compress = compress
+        self.compress_min_chars = compress_min_chars
+        self._blobs = weakref.WeakValueDictionary()
+        self.lock = threading.Lock()
+
+    def put(self, text: str) -> ContentBlob:
+        encoded = text.encode('utf-8')
+        key = hashlib.blake2b(encoded, digest_size=16).digest()
+        with self.lock:
+            blob = self._blobs.get(key)
+        if blob is not None:
+            return blob
+
+        if self.compress and len(text) >= self.compress_min_chars:
+            blob = ContentBlob(key, zlib.compress(encoded, 1), True)
+        else:
+            blob = ContentBlob(key, text, False)
+        with self.lock:
+            #another thread may have stored the same content meanwhile
+            return self._blobs.setdefault(key, blob)
+
+    #number of distinct bodies held and their stored size
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            blobs = list(self._blobs.values())
+        return {"entries": len(blobs), "stored_bytes": sum(blob.stored_bytes() for blob in blobs)}
+
+_content_store = None
+_store_lock = threading.Lock()
+
+#process-wide store configured from environment
+def get_content_store() -> ContentStore:
+    global _content_store
+    with _store_lock:
+        if _content_store is None:
+            _content_store = ContentStore(
+                compress=os.getenv("SOURCE_COMPRESSION", "False").lower() == "true",
+                compress_min_chars=int(os.getenv("SOURCE_COMPRESS_MIN_CHARS", "4096"))
+            )
+        return _content_store
+
+#one fetched source; reads like the old source dict (get, [], keys, to_dict)
+class SourceRecord:
+    __slots__ = ("url", "type", "title", "length", "timestamp", "_blob")
+
+    FIELDS = ("url", "type", "title", "content", "length", "timestamp")
+
+    def __init__(self, url: str, type: str, title: str, content: str, timestamp: float = None, store: ContentStore = None):
+        self.url = url
+        self.type = type
+        self.title = title
+        self.length = len(content)
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self._blob = (store or get_content_store()).put(content)
+
+    @classmethod
+    def from_dict(cls, source: Dict, store: ContentStore = None) -> "SourceRecord":
+        return cls(
+            source.get('url', 'Unknown'),
+            source.get('type', 'unknown'),
+            source.get('title', 'Untitled'),
+            source.get('content', ''),
+            source.get('timestamp'),
+            store
+        )
+
+    @property
+    def content(self) -> str:
+        return self._blob.text()
+
+    #views computed on demand - nothing derived from the content is kept on the record
+    def excerpt(self, limit: int) -> str:
+        return self._blob.prefix(limit)
+
+    def sanitized(self, max_chars: int = None) -> str:
+        content = self.excerpt(max_chars) if max_chars else self.content
+        return sanitize_scraped_content(content)
+
+    def __getitem__(self, key: str):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        if key not in self.FIELDS:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS
+
+    def keys(self):
+        return self.FIELDS
+
+    def to_dict(self) -> Dict:
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+    def __repr__(self):
+        return f"SourceRecord(url={self.url!r}, type={self.type!r}, length={self.length})"
+
+#accept plain source dicts wherever records are expected
+def as_record(source) -> Optional[SourceRecord]:
+    if source is None or isinstance(source, SourceRecord):
+        return source
+    return SourceRecord.from_dict(source)
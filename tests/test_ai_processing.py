@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 
 load_dotenv()
 sys.path.insert(0, os.getenv("PYTHONPATH"))
-from src.ai_processing import process_with_ai, generate_search_queries
+from src.ai_processing import process_with_ai, process_with_ai_map_reduce, generate_search_queries
 
 #test processing data with AI
 def test_process_with_ai():
@@ -38,6 +38,32 @@ def test_process_with_ai():
         json.dump(response.model_dump(), f, ensure_ascii=False, indent=4)
         print(f"\nStructured response saved to {output_file}")
 
+#test map-reduce summarization over the saved page contents
+def test_process_with_ai_map_reduce():
+    input_file = "debug/test_google_results_with_content.json"
+    with open(input_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    user_query = "Jaké služby as4u.cz poskytuje?"
+
+    #older runs saved plain text, test_google_search_with_content saves source dicts
+    sources = [
+        content if isinstance(content, dict) else
+        {"url": url, "type": "html", "title": url, "content": content, "length": len(content)}
+        for url, content in data['contents'].items()
+    ]
+
+    response = process_with_ai_map_reduce(sources, user_query)
+
+    print("\n=== AI Response (Map-Reduce) ===")
+    print(f"Summary: {response.summary}")
+    print(f"\nSources Used:")
+    for source in response.sources_used:
+        print(f"  - {source}")
+    print(f"Confidence: {response.confidence}")
+
+    assert response.confidence in ("high", "medium", "low")
+
 #test generating search queries with AI
 def test_generate_search_queries():
     user_input = "Kde leží Liberec?"
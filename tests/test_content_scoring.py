@@ -0,0 +1,31 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+sys.path.insert(0, os.getenv("PYTHONPATH"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from corpus import small_page
+from content_scoring import reset_site_blocks
+from page_search import extract_text_from_html
+
+#the same page reached through URL variants must not be taken for the site's boilerplate
+def test_url_variants_keep_content():
+    reset_site_blocks()
+    html = small_page()
+    urls = [
+        "https://www.x.cz/a",
+        "http://www.x.cz/a",
+        "https://www.x.cz/a?utm_source=g",
+        "https://www.x.cz/a/",
+    ]
+
+    outputs = [extract_text_from_html(html, url=url, selector="density")[0] for url in urls]
+    print(f"Lengths: {[len(output) for output in outputs]}")
+    assert len(outputs[0]) > 1000
+    assert all(output == outputs[0] for output in outputs)
+    reset_site_blocks()
+
+if __name__ == "__main__":
+    test_url_variants_keep_content()
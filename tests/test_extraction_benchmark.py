@@ -0,0 +1,22 @@
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+sys.path.insert(0, os.getenv("PYTHONPATH"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from bench_extraction import run_benchmarks, load_baselines, compare, print_report
+
+#fail when extraction got slower or hungrier than the stored baselines
+#(looser time limit than the CLI default - shared test machines are noisy)
+def test_extraction_performance():
+    run = run_benchmarks(repeat=3)
+    baselines = load_baselines()
+    print_report(run, baselines)
+
+    regressions = compare(run, baselines, time_threshold=2.0, memory_threshold=1.25)
+    assert not regressions, "Performance regressions:\n" + "\n".join(regressions)
+
+if __name__ == "__main__":
+    test_extraction_performance()
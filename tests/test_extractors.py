@@ -0,0 +1,66 @@
+import os
+import io
+import sys
+import zipfile
+from dotenv import load_dotenv
+
+load_dotenv()
+sys.path.insert(0, os.getenv("PYTHONPATH"))
+
+from extractors import detect_document_type, extract_document
+
+#build an in-memory zip based document
+def make_archive(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+#test DOCX detection and extraction
+def test_docx_extraction():
+    ns = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    docx = make_archive({
+        "word/document.xml": (
+            f'<w:document {ns}><w:body>'
+            f'<w:p><w:r><w:t>Otevírací doba</w:t></w:r></w:p>'
+            f'<w:p><w:r><w:t>Po-Pá 8:00-16:00</w:t></w:r></w:p>'
+            f'</w:body></w:document>'
+        )
+    })
+
+    assert detect_document_type(docx) == "docx"
+    text = extract_document(docx, "docx")
+    print(f"DOCX: {text}")
+    assert text == "Otevírací doba Po-Pá 8:00-16:00"
+
+#test XLSX detection and extraction with shared strings
+def test_xlsx_extraction():
+    ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    xlsx = make_archive({
+        "xl/workbook.xml": "<workbook/>",
+        "xl/sharedStrings.xml": f'<sst {ns}><si><t>Služba</t></si><si><t>Cena</t></si></sst>',
+        "xl/worksheets/sheet1.xml": (
+            f'<worksheet {ns}><sheetData>'
+            f'<row><c t="s"><v>0</v></c><c t="s"><v>1</v></c></row>'
+            f'<row><c t="inlineStr"><is><t>Hosting</t></is></c><c><v>990</v></c></row>'
+            f'</sheetData></worksheet>'
+        )
+    })
+
+    assert detect_document_type(xlsx) == "xlsx"
+    text = extract_document(xlsx, "xlsx")
+    print(f"XLSX: {text}")
+    assert text == "Služba | Cena Hosting | 990"
+
+#test that character limits are respected
+def test_text_limit():
+    content = ("word " * 1000).encode("utf-8")
+    assert detect_document_type(content, "text/plain; charset=utf-8") == "text"
+    text = extract_document(content, "text", max_chars=100)
+    assert len(text) <= 100
+
+if __name__ == "__main__":
+    test_docx_extraction()
+    test_xlsx_extraction()
+    test_text_limit()
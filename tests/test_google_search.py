@@ -6,7 +6,7 @@ from dotenv import load_dotenv
 load_dotenv()
 sys.path.insert(0, os.getenv("PYTHONPATH"))
 
-from page_search import search_google, fetch_page_text
+from page_search import search_google, fetch_page_text, rank_results
 
 #test google search
 def test_google_search():
@@ -20,6 +20,20 @@ def test_google_search():
 
     print(f"Results saved to {output_file}")
 
+#test rich search results with rank fusion and snippet scoring
+def test_google_search_ranked():
+    queries = ["as4u služby", "as4u kontakt", "as4u produkty"]
+
+    results = search_google(queries, max=10, rich=True)
+    ranked = rank_results(results, "Jaké služby as4u.cz poskytuje?", top_k=4)
+
+    for result in ranked:
+        print(f"{result.score:.2f} [{result.query} #{result.rank}] {result.url}")
+        print(f"  {result.title} - {result.snippet[:100]}")
+
+    assert len(ranked) <= 4
+    assert len({result.url for result in ranked}) == len(ranked)
+
 #test google search and fetch page contents
 def test_google_search_with_content():
     queries = ["as4u služby", "as4u kontakt", "as4u careers"]
@@ -30,7 +44,7 @@ def test_google_search_with_content():
     for url in results:
         content = fetch_page_text(url)
         if content:
-            contents[url] = content
+            contents[url] = content.to_dict()
 
     output_file = "debug/test_google_results_with_content.json"
     with open(output_file, "w", encoding="utf-8") as f:
@@ -48,7 +62,7 @@ def test_page_scrape():
 
     output_file = "debug/test_page_content.txt"
     with open(output_file, "w", encoding="utf-8") as f:
-        f.write(content)
+        f.write(content.content)
 
     print(f"Page content saved to {output_file}")
 
@@ -67,8 +81,8 @@ def test_selenium_fallback():
         content = fetch_page_text(url)
         
         if content:
-            print(f"Success! Extracted {len(content)} characters")
-            preview = content[:150] + "..." if len(content) > 150 else content
+            print(f"Success! Extracted {content.length} characters")
+            preview = content.excerpt(150) + "..." if content.length > 150 else content.content
             print(f"Preview: {preview}")
         else:
             print(f"Failed to fetch {url}")
@@ -83,8 +97,8 @@ def test_force_selenium():
     content = fetch_page_text(url, use_selenium=True)
     
     if content:
-        print(f"Success! Extracted {len(content)} characters")
-        preview = content[:100]
+        print(f"Success! Extracted {content.length} characters")
+        preview = content.excerpt(100)
         print(f"First 100 characters: {preview}")
     else:
         print(f"Failed to fetch {url}")